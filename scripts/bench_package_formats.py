@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+""" Compare package size and runner-side extraction time of gzip, zstd and lz4 DBT packages.
+Each format is packed with tar_my_dbt.sh (formats whose CLI is not installed are skipped) and
+extracted with the same code path the runner uses.
+
+Usage: bench_package_formats.py -c <parent dir> -s <dbt project folder> [-r repeats]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.classes.archive import ArchiveError, extract_package  # noqa: E402
+
+FORMATS = {"gzip": ("gzip", "tar.gz"), "zstd": ("zstd", "tar.zst"), "lz4": ("lz4", "tar.lz4")}
+
+
+def bench(changedir: str, source: str, repeats: int) -> None:
+    changedir = os.path.abspath(changedir)
+    script = os.path.join(REPO_ROOT, "scripts", "tar_my_dbt.sh")
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (cli, extension) in FORMATS.items():
+            if not shutil.which(cli):
+                print(f"Skipping {name}: {cli} not installed")
+                continue
+            subprocess.run(["bash", script, "-c", changedir, "-s", source, "-f", name],
+                           cwd=workdir, check=True, capture_output=True)
+            package = os.path.join(workdir, f"{source}.{extension}")
+            timings = []
+            for repeat in range(repeats):
+                dest = os.path.join(workdir, f"{name}-{repeat}")
+                started = time.perf_counter()
+                try:
+                    extract_package(package, dest)
+                except ArchiveError as e:
+                    print(f"Skipping {name}: {e}")
+                    break
+                timings.append(time.perf_counter() - started)
+                shutil.rmtree(dest)
+            if timings:
+                results[name] = (os.path.getsize(package), min(timings))
+
+    if "gzip" not in results:
+        return
+    gzip_size, gzip_time = results["gzip"]
+    print(f"{'format':<8}{'bytes':>14}{'vs gzip':>10}{'extract s':>12}{'vs gzip':>10}")
+    for name, (size, seconds) in results.items():
+        print(f"{name:<8}{size:>14}{size / gzip_size:>10.2f}{seconds:>12.4f}{seconds / gzip_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DBT package formats")
+    parser.add_argument("-c", dest="changedir", default=".", help="Parent directory of the dbt project folder")
+    parser.add_argument("-s", dest="source", required=True, help="Name of the dbt project folder")
+    parser.add_argument("-r", dest="repeats", type=int, default=5, help="Extractions per format (best is reported)")
+    args = parser.parse_args()
+    bench(args.changedir, args.source, args.repeats)
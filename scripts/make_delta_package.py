@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+""" Build a delta DBT package: a manifest.json of per-file sha256 hashes plus an objects/ folder
+holding each distinct file once, named by its hash. Publish the output folder as-is and point
+DBT_PACKAGE_URL at its manifest.json with DBT_PACKAGE_TYPE=delta
+
+Usage: make_delta_package.py -c <parent dir> -s <dbt project folder> -o <output dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+EXCLUDES = {"target", "dbt_modules", "logs", ".user.yml"}
+
+
+def build(changedir: str, source: str, output: str) -> dict:
+    objects = os.path.join(output, "objects")
+    os.makedirs(objects, exist_ok=True)
+    files = {}
+    for root, dirs, names in os.walk(os.path.join(changedir, source)):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDES)
+        for name in sorted(names):
+            if name in EXCLUDES:
+                continue
+            path = os.path.join(root, name)
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+            if not os.path.exists(os.path.join(objects, sha256)):
+                shutil.copyfile(path, os.path.join(objects, sha256))
+            relpath = os.path.relpath(path, changedir).replace(os.sep, "/")
+            files[relpath] = {"sha256": sha256, "size": os.path.getsize(path), "mode": os.stat(path).st_mode & 0o777}
+
+    manifest = {"objects": "objects", "files": files}
+    with open(os.path.join(output, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a delta DBT package")
+    parser.add_argument("-c", dest="changedir", default=".", help="Parent directory of the dbt project folder")
+    parser.add_argument("-s", dest="source", required=True, help="Name of the dbt project folder")
+    parser.add_argument("-o", dest="output", required=True, help="Output folder for manifest.json and objects/")
+    args = parser.parse_args()
+    built = build(args.changedir, args.source, args.output)
+    print(f"Wrote {len(built['files'])} files to {args.output}/manifest.json")
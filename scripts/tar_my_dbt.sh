@@ -1,11 +1,53 @@
-while getopts c:s: flag
+# Package a dbt project folder into a reproducible tarball.
+# Usage: tar_my_dbt.sh -c <parent dir> -s <dbt project folder> [-f gzip|zstd|lz4] [-l level] [-t threads]
+# -t sets the zstd worker threads (0: one per core). gzip and lz4 always pack single threaded.
+# The tarball is deterministic (sorted entries, fixed mtime/owner, modes normalized to 755/644 depending on
+# whether the entry is a directory or executable, whatever the checkout's umask) so the same project always
+# produces the same bytes and sha256. Set SOURCE_DATE_EPOCH to stamp entries with a different mtime (default: 0).
+# The tar is compressed from a file rather than a pipe, so zstd and lz4 record its size in their frame header
+# and the runner can size its workspace without decompressing the package.
+format="gzip"
+level=""
+threads=0
+while getopts c:s:f:l:t: flag
 do
     case "${flag}" in
         c) changedir=${OPTARG};;
         s) source=${OPTARG};;
+        f) format=${OPTARG};;
+        l) level=${OPTARG};;
+        t) threads=${OPTARG};;
     esac
 done
 echo "Dir: $changedir";
 echo "Source: $source";
+echo "Format: $format";
 
-tar --exclude target --exclude dbt_modules --exclude logs --exclude .user.yml -C $changedir -czf $source.tar.gz $source/
+case "${format}" in
+    gzip)
+        # Always gzip -n (no name or timestamp in the header): pigz produces different bytes, so using it
+        # whenever it happens to be installed would give the same project a different sha256 per machine
+        extension="tar.gz"
+        compressor="gzip -n -${level:-6}";;
+    zstd)
+        # zstd's multithreaded output does not depend on the number of threads, so -t only changes speed
+        extension="tar.zst"
+        compressor="zstd -q -T$threads -${level:-12}";;
+    lz4)
+        # lz4 packs single threaded (-t is ignored); it is fast enough that compression is rarely the bottleneck
+        extension="tar.lz4"
+        compressor="lz4 -q --content-size -${level:-9}";;
+    *)
+        echo "Unsupported format: $format (expected gzip, zstd or lz4)"
+        exit 1;;
+esac
+
+set -e
+tarball=$(mktemp)
+trap 'rm -f "$tarball"' EXIT
+tar --exclude target --exclude dbt_modules --exclude logs --exclude .user.yml \
+    --sort=name --format=gnu --mtime="@${SOURCE_DATE_EPOCH:-0}" --owner=0 --group=0 --numeric-owner \
+    --mode='u=rwX,go=rX' \
+    -C $changedir -cf "$tarball" $source/
+$compressor -c "$tarball" > $source.$extension
+echo "Package: $source.$extension";
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# pylint: disable=import-outside-toplevel, raise-missing-from
+
+""" Functions for unpacking DBT package tarballs. The compression format (gzip, zstd or lz4) is detected
+from the archive's magic bytes rather than its file name. zstd and lz4 support needs the optional
+zstandard and lz4 packages, which are only imported when such a package is extracted """
+
+import os
+import struct
+import tarfile
+from typing import Optional
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+LZ4_MAGIC = b"\x04\x22\x4d\x18"
+TAR_MAGIC_OFFSET = 257
+TAR_MAGIC = b"ustar"
+ZSTD_FCS_BYTES = (0, 2, 4, 8)
+ZSTD_DICTIONARY_ID_BYTES = (0, 1, 2, 4)
+
+
+class ArchiveError(Exception):
+    """Raised when a DBT package is not a supported archive"""
+
+
+def detect_format(path: str) -> str:
+    """Detect the compression format of a package from its magic bytes.
+    Returns one of gzip, zstd, lz4 or tar (uncompressed)"""
+    with open(path, 'rb') as f:
+        header = f.read(TAR_MAGIC_OFFSET + len(TAR_MAGIC))
+    if header.startswith(GZIP_MAGIC):
+        return "gzip"
+    if header.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if header.startswith(LZ4_MAGIC):
+        return "lz4"
+    if header[TAR_MAGIC_OFFSET:].startswith(TAR_MAGIC):
+        return "tar"
+    raise ArchiveError(f"{path} is not a gzip, zstd, lz4 or tar archive")
+
+
+def uncompressed_size(path: str) -> Optional[int]:
+    """Read the uncompressed size of a package from its archive header, without decompressing it. Returns None
+    when the archive does not record it (zstd and lz4 only do when the compressor was given a file, not a pipe)"""
+    archive_format = detect_format(path)
+    with open(path, 'rb') as f:
+        if archive_format == "gzip":
+            # ISIZE, the last 4 bytes of the stream, holds the uncompressed size modulo 2^32. A tar, padded to
+            # whole records, compresses to less than its own size, so a smaller ISIZE means it wrapped past 4GiB
+            f.seek(-4, os.SEEK_END)
+            size = struct.unpack("<I", f.read(4))[0]
+            return size if size >= f.tell() else None
+        if archive_format == "zstd":
+            header = f.read(18)
+            descriptor = header[4]
+            fcs_flag, single_segment, dictionary_flag = descriptor >> 6, descriptor >> 5 & 1, descriptor & 3
+            fcs_bytes = ZSTD_FCS_BYTES[fcs_flag] or single_segment
+            if not fcs_bytes:
+                return None
+            offset = 5 + (not single_segment) + ZSTD_DICTIONARY_ID_BYTES[dictionary_flag]
+            size = int.from_bytes(header[offset:offset + fcs_bytes], "little")
+            return size + 256 if fcs_bytes == 2 else size
+        if archive_format == "lz4":
+            header = f.read(14)
+            content_size_flag = header[4] >> 3 & 1
+            return struct.unpack("<Q", header[6:14])[0] if content_size_flag else None
+    return os.path.getsize(path)
+
+
+def extract_package(path: str, dest: str) -> str:
+    """Extract a DBT package tarball into dest, streaming it through the detected decompressor.
+    Returns the detected format"""
+    archive_format = detect_format(path)
+    if archive_format == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ArchiveError("zstd packages need the zstandard package installed")
+        with open(path, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                tar.extractall(dest)
+    elif archive_format == "lz4":
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ArchiveError("lz4 packages need the lz4 package installed")
+        with lz4.frame.open(path, 'rb') as f:
+            with tarfile.open(fileobj=f, mode="r|") as tar:
+                tar.extractall(dest)
+    else:
+        with tarfile.open(path, "r:gz" if archive_format == "gzip" else "r:") as tar:
+            tar.extractall(dest)
+    return archive_format
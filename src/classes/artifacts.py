@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# pylint: disable=import-outside-toplevel, broad-except
+
+""" Class representing the artifact shipping stage at the end of a DBT run. Run artifacts and logs are
+compressed and uploaded to S3 concurrently under a per-run prefix, followed by an index object that
+describes the upload. Shipping is bounded by a deadline so it never holds up the runner's exit """
+
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from src.classes.logger import DBTLogger
+
+EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+MB = 1024 * 1024
+PART_CONCURRENCY = 4
+# Parts are read into memory whole, so this bounds the memory all uploads together hold at once
+MAX_PARTS_IN_FLIGHT = 4
+# The index upload and the abort of abandoned uploads run in a slice reserved at the end of the deadline: at most
+# this long, and at most half of the deadline. Their requests time out within the slice and are not retried
+CLEANUP_TIMEOUT_SECONDS = 5
+
+
+def open_compressed(path: str, compression: str):
+    """Open a file for writing through the given compression"""
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(threads=-1).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb')
+
+
+class Artifact:
+    """A run artifact to upload: one file, or a folder batched into a single tarball"""
+
+    def __init__(self, name: str, path: str, batch: bool = False):
+        self.name = name
+        self.path = path
+        self.batch = batch
+        self.entry = {"name": name, "status": "pending"}
+
+    def compress(self, workdir: str, compression: str) -> str:
+        """Compress the artifact into workdir, returning the compressed file path"""
+        extension = EXTENSIONS[compression]
+        if self.batch:
+            compressed = os.path.join(workdir, f"{self.name.replace('/', '_')}.tar.{extension}")
+            with open_compressed(compressed, compression) as f, tarfile.open(fileobj=f, mode="w|") as tar:
+                tar.add(self.path, arcname=self.name)
+        else:
+            compressed = os.path.join(workdir, f"{self.name.replace('/', '_')}.{extension}")
+            with open(self.path, 'rb') as source, open_compressed(compressed, compression) as f:
+                shutil.copyfileobj(source, f, MB)
+        return compressed
+
+
+class ArtifactShipper:
+    """
+    Compresses and uploads the artifacts of a DBT run to s3://<bucket>/<prefix>/. Uploads run on daemon
+    worker threads using S3 multipart transfers, so when the deadline passes the runner can exit and leave
+    unfinished uploads behind. The index object lists every artifact with its key, sizes, sha256 and status
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str,
+        compression: str = "gzip",
+        deadline: float = 60.0,
+        workers: int = 8,
+        multipart_threshold: int = 8 * MB,
+        region: str = None,
+        logger: DBTLogger = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.compression = compression
+        self.deadline = deadline
+        self.workers = workers
+        self.multipart_threshold = multipart_threshold
+        self.region = region
+        self.logger = logger or DBTLogger()
+        self._part_slots = threading.BoundedSemaphore(MAX_PARTS_IN_FLIGHT)
+        self._multipart_uploads = {}
+        self._multipart_lock = threading.Lock()
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unsupported artifact compression: {compression}")
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                self.logger.printlog("zstandard is not installed. Compressing artifacts with gzip instead")
+                self.compression = "gzip"
+
+    @staticmethod
+    def collect(dbt_path: str, extra_paths: List[str] = None) -> List[Artifact]:
+        """Collect the artifacts of a DBT run: run results, manifest, compiled SQL and logs"""
+        artifacts = []
+        target = os.path.join(dbt_path, "target")
+        for name in ("run_results.json", "manifest.json", "sources.json", "catalog.json"):
+            if os.path.isfile(os.path.join(target, name)):
+                artifacts.append(Artifact(f"target/{name}", os.path.join(target, name)))
+        # Compiled and run SQL can be thousands of small files, so each folder is shipped as one tarball
+        for name in ("compiled", "run"):
+            if os.path.isdir(os.path.join(target, name)):
+                artifacts.append(Artifact(f"target/{name}", os.path.join(target, name), batch=True))
+        logs = os.path.join(dbt_path, "logs")
+        if os.path.isdir(logs):
+            for name in sorted(os.listdir(logs)):
+                if os.path.isfile(os.path.join(logs, name)):
+                    artifacts.append(Artifact(f"logs/{name}", os.path.join(logs, name)))
+        for path in extra_paths or []:
+            if path and os.path.isfile(path):
+                artifacts.append(Artifact(os.path.basename(path), path))
+        return artifacts
+
+    def client(self, config=None):
+        """Create an S3 client in the shipper's region"""
+        import boto3
+
+        if self.region:
+            return boto3.client("s3", region_name=self.region, config=config)
+        return boto3.client("s3", config=config)
+
+    def upload_file(self, client, path: str, key: str) -> None:
+        """Upload a file, using a multipart upload with concurrent parts above the multipart threshold. Parts are
+        sent from daemon threads rather than boto3's transfer manager, whose worker threads would hold up exit.
+        No more than MAX_PARTS_IN_FLIGHT parts are held in memory across all uploads"""
+        size = os.path.getsize(path)
+        if size <= self.multipart_threshold:
+            with open(path, 'rb') as f:
+                client.put_object(Bucket=self.bucket, Key=key, Body=f)
+            return
+
+        upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+        with self._multipart_lock:
+            self._multipart_uploads[key] = upload_id
+        part_numbers = queue.Queue()
+        for part_number in range(1, (size + self.multipart_threshold - 1) // self.multipart_threshold + 1):
+            part_numbers.put(part_number)
+        parts, errors = [], []
+
+        def upload_parts() -> None:
+            while not errors:
+                try:
+                    part_number = part_numbers.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    with self._part_slots:
+                        with open(path, 'rb') as f:
+                            f.seek((part_number - 1) * self.multipart_threshold)
+                            body = f.read(self.multipart_threshold)
+                        response = client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                      PartNumber=part_number, Body=body)
+                    parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=upload_parts, daemon=True) for _ in range(PART_CONCURRENCY)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        try:
+            if errors:
+                client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                raise errors[0]
+            client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])})
+        finally:
+            with self._multipart_lock:
+                self._multipart_uploads.pop(key, None)
+
+    def upload(self, client, artifact: Artifact, workdir: str) -> None:
+        """Compress and upload one artifact, recording the outcome in its index entry"""
+        try:
+            compressed = artifact.compress(workdir, self.compression)
+            digest = hashlib.sha256()
+            with open(compressed, 'rb') as f:
+                for chunk in iter(lambda: f.read(MB), b""):
+                    digest.update(chunk)
+            if artifact.batch:
+                key = f"{self.prefix}/{artifact.name}.tar.{EXTENSIONS[self.compression]}"
+            else:
+                key = f"{self.prefix}/{artifact.name}.{EXTENSIONS[self.compression]}"
+            self.upload_file(client, compressed, key)
+            artifact.entry.update({
+                "key": key,
+                "status": "uploaded",
+                "size": os.path.getsize(artifact.path) if not artifact.batch else None,
+                "compressed_size": os.path.getsize(compressed),
+                "sha256": digest.hexdigest(),
+            })
+        except Exception as e:
+            artifact.entry.update({"status": "failed", "error": str(e)})
+
+    def ship(self, artifacts: List[Artifact]) -> Optional[dict]:
+        """Upload the artifacts concurrently, then abort abandoned multipart uploads and write the index object
+        in a cleanup slice reserved at the end of the deadline. Returns the index"""
+        from botocore.config import Config
+
+        started = time.monotonic()
+        cleanup_seconds = min(CLEANUP_TIMEOUT_SECONDS, self.deadline / 2)
+        client = self.client()
+        cleanup_client = self.client(Config(
+            connect_timeout=cleanup_seconds,
+            read_timeout=cleanup_seconds,
+            retries={"total_max_attempts": 1},
+        ))
+        workdir = tempfile.mkdtemp(prefix="dbt_artifacts_")
+        pending = queue.Queue()
+        for artifact in artifacts:
+            pending.put(artifact)
+
+        def work() -> None:
+            while True:
+                try:
+                    artifact = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self.upload(client, artifact, workdir)
+
+        # Daemon threads never keep the interpreter alive, so uploads still running at the deadline are abandoned
+        threads = [threading.Thread(target=work, name=f"artifact-upload-{i}", daemon=True)
+                   for i in range(min(self.workers, len(artifacts)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(0.0, self.deadline - cleanup_seconds - (time.monotonic() - started)))
+
+        # Copy the entries, since abandoned uploads may still update theirs
+        entries = [dict(artifact.entry) for artifact in artifacts]
+        uploaded = [entry for entry in entries if entry["status"] == "uploaded"]
+        index = {
+            "bucket": self.bucket,
+            "prefix": self.prefix,
+            "compression": self.compression,
+            "complete": len(uploaded) == len(entries),
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "artifacts": entries,
+        }
+
+        def abort(key: str, upload_id: str) -> None:
+            try:
+                cleanup_client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                self.logger.printlog(f"ERROR: Failed to abort abandoned upload of {key}. Error: {e}")
+
+        def put_index() -> None:
+            try:
+                cleanup_client.put_object(Bucket=self.bucket, Key=f"{self.prefix}/index.json",
+                                          Body=json.dumps(index, indent=2).encode("utf-8"),
+                                          ContentType="application/json")
+            except Exception as e:
+                self.logger.printlog(f"ERROR: Failed to upload artifact index. Error: {e}")
+
+        # Parts of abandoned multipart uploads are billed until the upload is aborted. The aborts and the index
+        # run concurrently, and whatever is still running when the cleanup slice ends is abandoned as well
+        with self._multipart_lock:
+            abandoned = dict(self._multipart_uploads)
+        cleanup = [threading.Thread(target=abort, args=item, name="artifact-abort", daemon=True)
+                   for item in abandoned.items()]
+        cleanup.append(threading.Thread(target=put_index, name="artifact-index", daemon=True))
+        for thread in cleanup:
+            thread.start()
+        for thread in cleanup:
+            thread.join(max(0.0, self.deadline - (time.monotonic() - started)))
+        if abandoned:
+            self.logger.printlog(f"Aborted {len(abandoned)} multipart uploads still running at the deadline")
+        if cleanup[-1].is_alive():
+            self.logger.printlog("ERROR: Artifact index upload did not finish before the deadline")
+        if all(not thread.is_alive() for thread in threads):
+            shutil.rmtree(workdir, ignore_errors=True)
+        self.logger.printlog(
+            f"Shipped {len(uploaded)} of {len(entries)} artifacts to s3://{self.bucket}/{self.prefix}/ "
+            f"in {index['elapsed_seconds']}s")
+        return index
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# pylint: disable=broad-except
+
+""" Class representing a delta DBT package. A delta package is published as a manifest of per-file
+sha256 hashes plus a content addressed store of file objects, so the runner only downloads the
+files that changed since the version it already holds """
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from src.classes.helpers import stream_to_file
+from src.classes.logger import DBTLogger
+from src.classes.mirrors import open_mirror
+
+MANIFEST_FILE = "manifest.json"
+FILES_DIR = "files"
+STAGING_DIR = ".staging"
+FETCH_WORKERS = 8
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def link_or_copy(source: str, target: str) -> None:
+    """Hard link a file where the filesystem allows it, otherwise copy it"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class DeltaError(Exception):
+    """Raised when a delta package cannot be fetched or fails verification"""
+
+
+def check_manifest(manifest) -> None:
+    """Check the shape of a delta package manifest, since its digests become object urls and cache lookups.
+    File modes are masked to the permission bits. Raises a ValueError describing the first problem found"""
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        raise ValueError("'files' is not an object")
+    if not isinstance(manifest.get("objects", ""), str):
+        raise ValueError("'objects' is not a string")
+    for path, entry in manifest["files"].items():
+        if os.path.isabs(path) or ".." in path.split("/"):
+            raise ValueError(f"invalid path {path}")
+        if not isinstance(entry, dict):
+            raise ValueError(f"entry for {path} is not an object")
+        if not isinstance(entry.get("sha256"), str) or not SHA256_PATTERN.fullmatch(entry["sha256"]):
+            raise ValueError(f"sha256 of {path} is not 64 lowercase hex characters")
+        for key in ("size", "mode"):
+            value = entry.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"{key} of {path} is not a non-negative integer")
+        if "mode" in entry:
+            entry["mode"] &= 0o777
+
+
+class DeltaPackage:
+    """
+    Object representing a delta DBT package. The manifest has the following layout, where object
+    urls are resolved relative to the manifest url unless "objects" is an absolute url:
+
+        {"objects": "objects", "files": {"dbt_project/models/a.sql": {"sha256": "...", "size": 12, "mode": 420}}}
+    """
+
+    def __init__(
+        self,
+        manifest_url: str,
+        cache_path: str,
+        expected_sha256: str = None,
+        logger: DBTLogger = None,
+    ):
+        self.manifest_url = manifest_url
+        self.cache_path = cache_path
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.logger = logger or DBTLogger()
+
+    def object_url(self, manifest: dict, digest: str) -> str:
+        """Get the url of a file object in the package's content addressed store"""
+        objects = manifest.get("objects", "objects").rstrip("/")
+        if "://" not in objects:
+            objects = f"{self.manifest_url.rsplit('/', 1)[0]}/{objects}"
+        return f"{objects}/{digest}"
+
+    def fetch_manifest(self) -> dict:
+        """Download the package manifest and verify it against the expected sha256"""
+        try:
+            chunks, close = open_mirror(self.manifest_url)
+            try:
+                content = b"".join(chunks)
+            finally:
+                close()
+        except Exception as e:
+            raise DeltaError(f"Could not fetch delta package manifest {self.manifest_url}: {e}")
+
+        digest = hashlib.sha256(content).hexdigest()
+        if self.expected_sha256 and digest != self.expected_sha256:
+            raise DeltaError(f"Manifest sha256 {digest} does not match expected sha256 {self.expected_sha256}")
+        try:
+            manifest = json.loads(content)
+            check_manifest(manifest)
+        except ValueError as e:
+            raise DeltaError(f"Malformed delta package manifest {self.manifest_url}: {e}")
+        return manifest
+
+    def cached_manifest(self) -> Optional[dict]:
+        """Get the manifest of the package version held in the cache, if any"""
+        path = os.path.join(self.cache_path, MANIFEST_FILE)
+        if not os.path.isdir(os.path.join(self.cache_path, FILES_DIR)) or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            check_manifest(manifest)
+        except (OSError, ValueError):
+            # A corrupted cache is treated as empty, so every file is fetched again
+            return None
+        return manifest
+
+    def fetch_object(self, url: str, digest: str, path: str) -> None:
+        """Download a file object, verifying its sha256 while it streams to disk"""
+        chunks, close = open_mirror(url)
+        try:
+            actual = stream_to_file(chunks, path)
+        finally:
+            close()
+        if actual != digest:
+            raise DeltaError(f"Object {url} has sha256 {actual}, expected {digest}")
+
+    def update_cache(self, manifest: dict) -> dict:
+        """Bring the cached package up to date with the manifest, reusing unchanged files and
+        downloading the rest. Returns transfer statistics"""
+        files_path = os.path.join(self.cache_path, FILES_DIR)
+        staging_path = os.path.join(self.cache_path, STAGING_DIR)
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+
+        # Any file in the held version can be reused by hash, which also covers renamed files
+        previous = self.cached_manifest() or {"files": {}}
+        held = {}
+        for path, entry in previous["files"].items():
+            held.setdefault(entry["sha256"], os.path.join(files_path, path))
+
+        stats = {"files": len(manifest["files"]), "reused": 0, "fetched": 0, "fetched_bytes": 0, "total_bytes": 0}
+        downloads = []
+        for path, entry in sorted(manifest["files"].items()):
+            target = os.path.join(staging_path, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            stats["total_bytes"] += entry.get("size", 0)
+            source = held.get(entry["sha256"])
+            if source and os.path.isfile(source) and os.path.getsize(source) == entry.get("size", 0):
+                link_or_copy(source, target)
+                stats["reused"] += 1
+            else:
+                downloads.append((self.object_url(manifest, entry["sha256"]), entry["sha256"], target))
+                stats["fetched"] += 1
+                stats["fetched_bytes"] += entry.get("size", 0)
+
+        try:
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+                for future in [executor.submit(self.fetch_object, *download) for download in downloads]:
+                    future.result()
+        except DeltaError:
+            raise
+        except Exception as e:
+            raise DeltaError(f"Could not fetch delta package object: {e}")
+        for path, entry in manifest["files"].items():
+            if "mode" in entry:
+                os.chmod(os.path.join(staging_path, path), entry["mode"])
+
+        # Swap the staged version in and record its manifest
+        shutil.rmtree(files_path, ignore_errors=True)
+        os.replace(staging_path, files_path)
+        with open(os.path.join(self.cache_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f)
+        return stats
+
+    def fetch(self, dest: str, manifest: dict = None) -> dict:
+        """Update the cached package and place its files in the destination folder, fetching the manifest
+        unless it has already been fetched. Returns transfer statistics"""
+        manifest = manifest or self.fetch_manifest()
+        os.makedirs(self.cache_path, exist_ok=True)
+        stats = self.update_cache(manifest)
+        self.logger.printlog(
+            f"Delta package: reused {stats['reused']} unchanged files, fetched {stats['fetched']} "
+            f"({stats['fetched_bytes']} of {stats['total_bytes']} bytes)")
+
+        # Replace the previous copy of the project in the destination. Files are copied rather than hard linked,
+        # since the run writes to the project (e.g. chmod of scripts) and must not change the cached versions
+        files_path = os.path.join(self.cache_path, FILES_DIR)
+        for top_level in {path.split("/", 1)[0] for path in manifest["files"]}:
+            shutil.rmtree(os.path.join(dest, top_level), ignore_errors=True)
+        for path in manifest["files"]:
+            source = os.path.join(files_path, path)
+            target = os.path.join(dest, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+        return stats
@@ -1,6 +1,8 @@
 """ Helper classes to be used by the DBT Runner Application """
 
+import hashlib
 import os
+from typing import Iterable
 
 
 class ChangeDir:
@@ -18,3 +20,15 @@ class ChangeDir:
 
     def __exit__(self, etype: str, value: str, traceback: str) -> None:
         os.chdir(self.saved_path)
+
+
+def stream_to_file(chunks: Iterable[bytes], path: str) -> str:
+    """Write a stream of byte chunks to a file, returning the sha256 hex digest of the
+    content computed on the fly so the file never needs to be read back"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            if chunk:
+                digest.update(chunk)
+                f.write(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# pylint: disable=import-outside-toplevel, broad-except
+
+""" Classes for fetching a DBT package from several mirrors of the same artifact. The fetch starts
+with the historically fastest mirror and hedges with a second mirror when the first one is slow to
+produce its first bytes. Whichever mirror responds first wins and the other request is cancelled """
+
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.classes.helpers import stream_to_file
+from src.classes.logger import DBTLogger
+
+CHUNK_SIZE = 32 * 1024
+READ_TIMEOUT_SECONDS = 300
+
+
+class MirrorError(Exception):
+    """Raised when none of the mirrors could provide the package"""
+
+
+def tracked_session(on_connect: Callable[[socket.socket], None]):
+    """Create a requests session that reports every socket it connects to on_connect. Shutting such a socket
+    down aborts a request even while it is still blocked waiting for the response"""
+    import requests
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TrackedHTTPConnection(HTTPConnection):
+        def connect(self):
+            super().connect()
+            on_connect(self.sock)
+
+    class TrackedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            super().connect()
+            on_connect(self.sock)
+
+    class TrackedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TrackedHTTPConnection
+
+    class TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TrackedHTTPSConnection
+
+    session = requests.Session()
+    for adapter in session.adapters.values():
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": TrackedHTTPConnectionPool,
+            "https": TrackedHTTPSConnectionPool,
+        }
+    return session
+
+
+def open_mirror(
+    url: str,
+    on_connect: Callable[[socket.socket], None] = None,
+) -> Tuple[Iterator[bytes], Callable[[], None]]:
+    """Open a streaming download from an HTTP(S) or s3://bucket/key mirror. HTTP(S) sockets are reported to
+    on_connect as they open. Returns the chunk iterator and a function that closes the underlying connection"""
+    if url.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = url[len("s3://"):].partition("/")
+        body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+        return body.iter_chunks(CHUNK_SIZE), body.close
+
+    import requests
+
+    if on_connect is None:
+        session = requests.Session()
+    else:
+        session = tracked_session(on_connect)
+
+    def close() -> None:
+        try:
+            response.close()
+        finally:
+            session.close()
+
+    try:
+        response = session.get(url, stream=True, timeout=READ_TIMEOUT_SECONDS)
+    except Exception:
+        session.close()
+        raise
+    try:
+        response.raise_for_status()
+    except Exception:
+        close()
+        raise
+    return response.iter_content(CHUNK_SIZE), close
+
+
+class MirrorStats:
+    """
+    Per-mirror latency statistics persisted to a local JSON file. Latency is the time to first byte,
+    smoothed with an exponentially weighted moving average
+    """
+
+    alpha = 0.3
+    failure_penalty = 30.0
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.mirrors = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self.mirrors = json.load(f)
+            except (OSError, ValueError):
+                self.mirrors = {}
+
+    def latency(self, url: str) -> Optional[float]:
+        """Get the smoothed time to first byte of a mirror, or None if it has never been measured"""
+        stats = self.mirrors.get(url)
+        return stats["latency"] if stats else None
+
+    def order(self, urls: List[str]) -> List[str]:
+        """Order mirrors from historically fastest to slowest. Unmeasured mirrors keep their configured order
+        after the measured ones"""
+        def key(indexed_url: Tuple[int, str]) -> Tuple[float, int]:
+            index, url = indexed_url
+            latency = self.latency(url)
+            return (latency if latency is not None else float("inf"), index)
+
+        return [url for _, url in sorted(enumerate(urls), key=key)]
+
+    def record(self, url: str, latency: float, failed: bool = False) -> None:
+        """Record a latency sample (or a failure, which counts as a slow sample) for a mirror"""
+        stats = self.mirrors.setdefault(url, {"latency": None, "samples": 0, "failures": 0})
+        if failed:
+            stats["failures"] += 1
+            latency = max(latency, self.failure_penalty)
+        else:
+            stats["samples"] += 1
+        if stats["latency"] is None:
+            stats["latency"] = latency
+        else:
+            stats["latency"] = self.alpha * latency + (1 - self.alpha) * stats["latency"]
+
+    def save(self) -> None:
+        """Write the statistics to the local stats file"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.mirrors, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class MirrorAttempt(threading.Thread):
+    """
+    A single download attempt against one mirror. The attempt opens the connection and waits
+    for the first chunk, then hands itself over to the results queue
+    """
+
+    def __init__(self, url: str, results: queue.Queue) -> None:
+        super().__init__(name=f"mirror-{url}", daemon=True)
+        self.url = url
+        self.results = results
+        self.chunks = None
+        self.error = None
+        self.latency = None
+        self.started_at = time.monotonic()
+        self._close = None
+        self._cancelled = threading.Event()
+        self._sockets = []
+        self._sockets_lock = threading.Lock()
+
+    def track(self, sock: socket.socket) -> None:
+        """Keep hold of a socket the attempt connects, shutting it down straight away if already cancelled"""
+        with self._sockets_lock:
+            self._sockets.append(sock)
+        if self._cancelled.is_set():
+            self.shutdown_sockets()
+
+    def shutdown_sockets(self) -> None:
+        """Shut down the attempt's sockets, which wakes the attempt if it is blocked waiting for a response"""
+        with self._sockets_lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self) -> None:
+        try:
+            chunks, self._close = open_mirror(self.url, on_connect=self.track)
+            # Skip keep-alive chunks so the latency reflects actual package bytes
+            first_chunk = next((chunk for chunk in chunks if chunk), b"")
+        except Exception as e:
+            if self._cancelled.is_set():
+                return
+            self.error = e
+            self.latency = self.elapsed
+            self.results.put(self)
+            return
+        self.latency = self.elapsed
+        if self._cancelled.is_set():
+            self.close()
+            return
+        self.chunks = itertools.chain([first_chunk], chunks)
+        self.results.put(self)
+
+    @property
+    def elapsed(self) -> float:
+        """Get the seconds since the attempt started"""
+        return time.monotonic() - self.started_at
+
+    def cancel(self) -> None:
+        """Cancel the attempt, aborting its request even if it has not received a response yet"""
+        self._cancelled.set()
+        self.shutdown_sockets()
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying connection"""
+        if self._close:
+            try:
+                self._close()
+            except Exception:
+                pass
+
+
+class MirrorFetcher:
+    """
+    Fetches a package from a list of mirrors that all serve the same artifact, verifying
+    the downloaded content against one expected sha256 digest
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        expected_sha256: str = None,
+        hedge_delay: float = 2.0,
+        stats_path: str = None,
+        logger: DBTLogger = None,
+    ):
+        self.urls = urls
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.hedge_delay = hedge_delay
+        self.stats = MirrorStats(stats_path)
+        self.logger = logger or DBTLogger()
+
+    def race(self, remaining: List[str]) -> MirrorAttempt:
+        """Start with the first remaining mirror and hedge with the next one whenever no mirror has
+        produced bytes within the hedge delay. Returns the first attempt to produce bytes and cancels
+        the others, putting them back at the front of the remaining mirrors"""
+        results = queue.Queue()
+        in_flight = []
+
+        def launch() -> None:
+            attempt = MirrorAttempt(remaining.pop(0), results)
+            in_flight.append(attempt)
+            attempt.start()
+
+        launch()
+        while True:
+            try:
+                attempt = results.get(timeout=self.hedge_delay if remaining else None)
+            except queue.Empty:
+                self.logger.printlog(
+                    f"No bytes from mirror(s) after {self.hedge_delay}s. Hedging with mirror: {remaining[0]}")
+                launch()
+                continue
+
+            in_flight.remove(attempt)
+            if attempt.error is None:
+                break
+            self.logger.printlog(f"Mirror {attempt.url} failed. Error: {attempt.error}")
+            self.stats.record(attempt.url, attempt.latency, failed=True)
+            if remaining:
+                launch()
+            elif not in_flight:
+                raise MirrorError("All package mirrors failed")
+
+        for loser in in_flight:
+            loser.cancel()
+            # A loser started by a hedge has only been waiting since the hedge, so its own elapsed time says little.
+            # It was at least slower than the winner plus the hedge delay, which is still worth learning from
+            self.stats.record(loser.url, max(loser.elapsed, attempt.latency + self.hedge_delay))
+            self.logger.printlog(f"Cancelled slower mirror: {loser.url}")
+        remaining[:0] = [loser.url for loser in in_flight]
+        return attempt
+
+    def fetch(self, path: str) -> str:
+        """Download the package into path from the fastest mirror. Returns the url of the mirror used"""
+        remaining = self.stats.order(self.urls)
+        try:
+            while remaining:
+                attempt = self.race(remaining)
+                self.logger.printlog(f"Downloading DBT package from mirror: {attempt.url}")
+                try:
+                    digest = stream_to_file(attempt.chunks, path)
+                except Exception as e:
+                    self.logger.printlog(f"Download from mirror {attempt.url} failed. Error: {e}")
+                    self.stats.record(attempt.url, attempt.elapsed, failed=True)
+                    continue
+                finally:
+                    attempt.close()
+
+                if self.expected_sha256 and digest != self.expected_sha256:
+                    self.logger.printlog(
+                        f"Package from mirror {attempt.url} has sha256 {digest}, expected {self.expected_sha256}")
+                    self.stats.record(attempt.url, attempt.elapsed, failed=True)
+                    continue
+
+                self.stats.record(attempt.url, attempt.latency)
+                return attempt.url
+            raise MirrorError("No package mirror provided a package matching the expected sha256")
+        finally:
+            try:
+                self.stats.save()
+            except OSError as e:
+                self.logger.printlog(f"Could not save mirror latency statistics. Error: {e}")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+""" Class representing a resource monitor for the DBT subprocess tree. The monitor samples the CPU
+and resident memory of a process and all of its descendants from /proc, keeps peak values for the
+run report, writes a time series for right-sizing pod requests and enforces soft and hard memory limits """
+
+import json
+import os
+import signal
+import threading
+import time
+from typing import Dict, Optional
+
+from src.classes.logger import DBTLogger
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+CGROUP_MEMORY_LIMIT_FILES = [
+    "/sys/fs/cgroup/memory.max",  # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",  # cgroup v1
+]
+# Limits derived from the container's cgroup memory limit when none are configured
+CGROUP_SOFT_LIMIT_RATIO = 0.8
+CGROUP_HARD_LIMIT_RATIO = 0.95
+MB = 1024 * 1024
+
+
+def read_proc_stat(pid: int) -> Optional[Dict[str, int]]:
+    """Read the parent pid, cpu ticks and rss of a process from /proc/<pid>/stat"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name is wrapped in parentheses and may itself contain spaces
+    fields = stat[stat.rindex(")") + 2:].split()
+    return {
+        "ppid": int(fields[1]),
+        "cpu_ticks": int(fields[11]) + int(fields[12]),
+        "rss_bytes": int(fields[21]) * PAGE_SIZE,
+    }
+
+
+def process_tree(root_pid: int) -> Dict[int, Dict[str, int]]:
+    """Get /proc stats of a process and all of its descendants, keyed by pid"""
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = read_proc_stat(int(entry))
+            if stat:
+                stats[int(entry)] = stat
+
+    tree = {}
+    pending = [root_pid]
+    children = {}
+    for pid, stat in stats.items():
+        children.setdefault(stat["ppid"], []).append(pid)
+    while pending:
+        pid = pending.pop()
+        if pid in stats and pid not in tree:
+            tree[pid] = stats[pid]
+            pending.extend(children.get(pid, []))
+    return tree
+
+
+def cgroup_memory_limit() -> Optional[int]:
+    """Get the container's cgroup memory limit in bytes, or None if it is unlimited or unknown"""
+    for path in CGROUP_MEMORY_LIMIT_FILES:
+        try:
+            with open(path, 'r') as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a huge page-aligned number
+        if value.isdigit() and int(value) < 2 ** 60:
+            return int(value)
+    return None
+
+
+class ResourceMonitor(threading.Thread):
+    """
+    Samples CPU and RSS of a process tree at a fixed interval. When the tree's RSS crosses the soft limit
+    a warning is logged; when it crosses the hard limit the process group is sent SIGTERM, followed by
+    SIGKILL if it is still running after the grace period. Limits derived from the cgroup limit leave out
+    reserved_bytes, memory charged to the container that is not part of the tree's RSS (a tmpfs workspace)
+    """
+
+    def __init__(
+        self,
+        pid: int,
+        interval: float = 5.0,
+        soft_limit_mb: float = None,
+        hard_limit_mb: float = None,
+        grace_period: float = 30.0,
+        timeseries_path: str = None,
+        logger: DBTLogger = None,
+        reserved_bytes: int = 0,
+    ):
+        super().__init__(name="resource-monitor", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.soft_limit = soft_limit_mb * MB if soft_limit_mb else None
+        self.hard_limit = hard_limit_mb * MB if hard_limit_mb else None
+        if self.soft_limit is None and self.hard_limit is None:
+            cgroup_limit = cgroup_memory_limit()
+            if cgroup_limit and cgroup_limit > reserved_bytes:
+                self.soft_limit = (cgroup_limit - reserved_bytes) * CGROUP_SOFT_LIMIT_RATIO
+                self.hard_limit = (cgroup_limit - reserved_bytes) * CGROUP_HARD_LIMIT_RATIO
+        self.grace_period = grace_period
+        self.timeseries_path = timeseries_path
+        if timeseries_path:
+            open(timeseries_path, 'w').close()
+        self.logger = logger or DBTLogger()
+
+        self.samples = 0
+        self.peak_rss_bytes = 0
+        self.peak_cpu_percent = 0.0
+        self.peak_processes = 0
+        self.cpu_seconds = 0.0
+        self.soft_limit_exceeded = False
+        self.terminated_at = None
+        self.killed = False
+        self._cpu_ticks = {}
+        self._sampling_started = time.monotonic()
+        self._last_sample = self._sampling_started
+        self._stop_sampling = threading.Event()
+
+    def sample(self) -> dict:
+        """Take one sample of the process tree, update the peaks and enforce the memory limits"""
+        now = time.monotonic()
+        tree = process_tree(self.pid)
+
+        # Accumulate per-process cpu deltas, so cpu used by processes that have since exited is kept
+        cpu_ticks = 0
+        for pid, stat in tree.items():
+            cpu_ticks += max(0, stat["cpu_ticks"] - self._cpu_ticks.get(pid, 0))
+            self._cpu_ticks[pid] = stat["cpu_ticks"]
+        cpu_seconds = cpu_ticks / CLOCK_TICKS
+        wall_seconds = max(now - self._last_sample, 1e-6)
+        self._last_sample = now
+
+        rss_bytes = sum(stat["rss_bytes"] for stat in tree.values())
+        point = {
+            "elapsed_seconds": round(now - self._sampling_started, 3),
+            "processes": len(tree),
+            "rss_bytes": rss_bytes,
+            "cpu_percent": round(100 * cpu_seconds / wall_seconds, 1),
+        }
+        self.samples += 1
+        self.cpu_seconds += cpu_seconds
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+        self.peak_cpu_percent = max(self.peak_cpu_percent, point["cpu_percent"])
+        self.peak_processes = max(self.peak_processes, len(tree))
+
+        if self.timeseries_path:
+            with open(self.timeseries_path, 'a') as f:
+                f.write(json.dumps(point) + "\n")
+        self.enforce_limits(rss_bytes)
+        return point
+
+    def enforce_limits(self, rss_bytes: int) -> None:
+        """Warn on the soft limit, terminate on the hard limit and kill after the grace period"""
+        if self.soft_limit and rss_bytes >= self.soft_limit and not self.soft_limit_exceeded:
+            self.soft_limit_exceeded = True
+            self.logger.printlog(
+                f"WARNING: DBT process memory {rss_bytes // MB}MB exceeded soft limit {self.soft_limit // MB:.0f}MB")
+
+        if self.hard_limit and rss_bytes >= self.hard_limit and self.terminated_at is None:
+            self.logger.printerror(
+                f"DBT process memory {rss_bytes // MB}MB exceeded hard limit {self.hard_limit // MB:.0f}MB. "
+                f"Terminating DBT process")
+            self.terminated_at = time.monotonic()
+            self.signal_tree(signal.SIGTERM)
+        elif self.terminated_at and not self.killed and time.monotonic() - self.terminated_at >= self.grace_period:
+            self.logger.printerror(f"DBT process still running {self.grace_period}s after SIGTERM. Killing it")
+            self.killed = True
+            self.signal_tree(signal.SIGKILL)
+
+    def signal_tree(self, signum: int) -> None:
+        """Send a signal to the monitored process group"""
+        try:
+            pgid = os.getpgid(self.pid)
+            # Never signal the runner's own process group
+            if pgid == os.getpgrp():
+                os.kill(self.pid, signum)
+            else:
+                os.killpg(pgid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def run(self) -> None:
+        while not self._stop_sampling.is_set():
+            self.sample()
+            self._stop_sampling.wait(self.interval)
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the monitor thread to finish"""
+        self._stop_sampling.set()
+        if self.is_alive():
+            self.join()
+
+    @property
+    def summary(self) -> dict:
+        """Get the peak resource usage and limit enforcement of the run, for the run report"""
+        return {
+            "samples": self.samples,
+            "interval_seconds": self.interval,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_cpu_percent": self.peak_cpu_percent,
+            "peak_processes": self.peak_processes,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "soft_limit_bytes": self.soft_limit,
+            "hard_limit_bytes": self.hard_limit,
+            "soft_limit_exceeded": self.soft_limit_exceeded,
+            "terminated_for_memory": self.terminated_at is not None,
+            "killed_for_memory": self.killed,
+            "timeseries_path": self.timeseries_path,
+        }
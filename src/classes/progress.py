@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# pylint: disable=broad-except, import-outside-toplevel
+
+""" Class representing live per-node progress of a DBT run. The tracker consumes dbt's JSON log events as
+they are produced, keeps start/finish state for every node, publishes it to a progress file (and optionally
+a local HTTP endpoint), writes OTLP JSON trace spans and raises slow-node alerts while the run is going """
+
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from typing import Optional
+
+from src.classes.logger import DBTLogger
+
+# Node statuses dbt reports once a node has finished
+FINISHED_STATUSES = {"success", "error", "fail", "skipped", "pass", "warn", "runtime error"}
+FAILED_STATUSES = {"error", "fail", "runtime error"}
+# Matches each direct dbt invocation in a shell command, so the JSON log flag can be added to it
+DBT_INVOCATION = re.compile(r"(^|&&|\|\||;|\|)(\s*)dbt\s+")
+
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+
+def with_json_logs(command: str) -> str:
+    """Add --log-format json to every direct dbt invocation in a shell command"""
+    return DBT_INVOCATION.sub(lambda match: f"{match.group(1)}{match.group(2)}dbt --log-format json ", command)
+
+
+def parse_event(line: str) -> Optional[dict]:
+    """Parse a dbt JSON log line, returning None for lines that are not JSON log events"""
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) else None
+
+
+def event_message(event: dict) -> str:
+    """Get the human readable message of a dbt log event. dbt < 1.4 keeps it at the top level,
+    later versions in info"""
+    return event.get("msg") or event.get("info", {}).get("msg") or ""
+
+
+def event_node_info(event: dict) -> Optional[dict]:
+    """Get the node_info of a dbt log event, if it relates to a node"""
+    node_info = event.get("node_info") or event.get("data", {}).get("node_info")
+    return node_info if node_info and node_info.get("unique_id") else None
+
+
+class ProgressTracker:
+    """
+    Tracks per-node progress of a DBT run from its JSON log event stream
+    """
+
+    def __init__(
+        self,
+        progress_path: str = None,
+        spans_path: str = None,
+        slow_node_seconds: float = None,
+        port: int = None,
+        interval: float = 1.0,
+        logger: DBTLogger = None,
+    ):
+        self.progress_path = progress_path
+        self.spans_path = spans_path
+        self.slow_node_seconds = slow_node_seconds
+        self.port = port
+        self.interval = interval
+        self.logger = logger or DBTLogger()
+
+        self.nodes = {}
+        self.started_at = time.time()
+        self.finished_at = None
+        self.trace_id = secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self._lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self._watcher = threading.Thread(target=self.watch, name="progress-watcher", daemon=True)
+        self._server = None
+        if spans_path:
+            open(spans_path, 'w').close()
+
+    def handle_line(self, line: str) -> Optional[str]:
+        """Consume one line of dbt output. Returns the message to print for it, or None if there is nothing to print"""
+        event = parse_event(line)
+        if event is None:
+            return line.rstrip("\n")
+        node_info = event_node_info(event)
+        if node_info:
+            self.update_node(node_info)
+        return event_message(event) or None
+
+    def update_node(self, node_info: dict) -> None:
+        """Update a node's state from the node_info of a log event"""
+        now = time.time()
+        finished = None
+        with self._lock:
+            node = self.nodes.setdefault(node_info["unique_id"], {
+                "unique_id": node_info["unique_id"],
+                "name": node_info.get("node_name"),
+                "resource_type": node_info.get("resource_type"),
+                "status": None,
+                "started_at": now,
+                "finished_at": None,
+                "duration_seconds": None,
+                "slow_alerted": False,
+            })
+            status = node_info.get("node_status")
+            finishing = status in FINISHED_STATUSES or bool(node_info.get("node_finished_at"))
+            # A finished node that starts again belongs to a later dbt invocation of the same command
+            if node["finished_at"] is not None and not finishing:
+                node.update({"started_at": now, "finished_at": None, "duration_seconds": None, "slow_alerted": False})
+            if node["finished_at"] is None:
+                node["status"] = status
+                if finishing:
+                    node["finished_at"] = now
+                    node["duration_seconds"] = round(now - node["started_at"], 3)
+                    finished = dict(node)
+        if finished:
+            self.write_span(self.node_span(finished))
+
+    def snapshot(self) -> dict:
+        """Get the current progress of the run"""
+        now = time.time()
+        with self._lock:
+            nodes = {unique_id: dict(node) for unique_id, node in self.nodes.items()}
+        running = [node for node in nodes.values() if node["finished_at"] is None]
+        for node in running:
+            node["running_seconds"] = round(now - node["started_at"], 3)
+        for node in nodes.values():
+            node.pop("slow_alerted")
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round((self.finished_at or now) - self.started_at, 3),
+            "nodes_started": len(nodes),
+            "nodes_finished": len(nodes) - len(running),
+            "nodes_failed": len([node for node in nodes.values() if node["status"] in FAILED_STATUSES]),
+            "running": sorted(node["unique_id"] for node in running),
+            "nodes": nodes,
+        }
+
+    def check_slow_nodes(self) -> None:
+        """Log an alert, once per node, for every node running longer than the slow node threshold"""
+        if not self.slow_node_seconds:
+            return
+        now = time.time()
+        with self._lock:
+            slow = [node for node in self.nodes.values() if node["finished_at"] is None and not node["slow_alerted"]
+                    and now - node["started_at"] >= self.slow_node_seconds]
+            for node in slow:
+                node["slow_alerted"] = True
+        for node in slow:
+            self.logger.printlog(
+                f"WARNING: Slow node {node['unique_id']} has been running for {now - node['started_at']:.0f}s "
+                f"(threshold {self.slow_node_seconds:.0f}s)")
+
+    def write_progress(self) -> None:
+        """Atomically replace the progress file with the current progress"""
+        if not self.progress_path:
+            return
+        tmp_path = f"{self.progress_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, self.progress_path)
+
+    def span(self, span_id: str, parent_span_id: str, name: str, start: float, end: float,
+             attributes: dict, failed: bool) -> dict:
+        """Build an OTLP JSON span"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": span_id,
+            "name": name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(int(start * 1e9)),
+            "endTimeUnixNano": str(int(end * 1e9)),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()
+                if value is not None
+            ],
+            "status": {"code": STATUS_CODE_ERROR if failed else STATUS_CODE_OK},
+        }
+        if parent_span_id:
+            span["parentSpanId"] = parent_span_id
+        return span
+
+    def node_span(self, node: dict) -> dict:
+        """Build the span of a finished node, as a child of the run's root span"""
+        return self.span(
+            secrets.token_hex(8), self.root_span_id, node["name"] or node["unique_id"],
+            node["started_at"], node["finished_at"],
+            {"dbt.unique_id": node["unique_id"], "dbt.resource_type": node["resource_type"],
+             "dbt.status": node["status"]},
+            node["status"] in FAILED_STATUSES,
+        )
+
+    def write_span(self, span: dict) -> None:
+        """Append a span to the spans file as one OTLP JSON ExportTraceServiceRequest per line"""
+        if not self.spans_path:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "beautiful-dbt-runner"}}]},
+            "scopeSpans": [{"scope": {"name": "beautiful-dbt-runner"}, "spans": [span]}],
+        }]}
+        with self._lock, open(self.spans_path, 'a') as f:
+            f.write(json.dumps(request) + "\n")
+
+    def serve(self) -> None:
+        """Serve the current progress as JSON over HTTP on the configured port"""
+        # http.server pulls in http.client, email and ssl, so it is only imported when progress is served
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(tracker.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("0.0.0.0", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="progress-server", daemon=True).start()
+        self.logger.printlog(f"Serving DBT run progress on port {self.server_port}")
+
+    @property
+    def server_port(self) -> Optional[int]:
+        """Get the port progress is served on, or None if it is not served over HTTP"""
+        return self._server.server_port if self._server else None
+
+    def watch(self) -> None:
+        """Publish progress and check for slow nodes at a fixed interval until stopped"""
+        while not self._stop_watching.wait(self.interval):
+            try:
+                self.check_slow_nodes()
+                self.write_progress()
+            except Exception as e:
+                self.logger.printlog(f"ERROR: Failed to publish DBT run progress. Error: {e}")
+
+    def start(self) -> None:
+        """Start publishing progress"""
+        if self.port is not None:
+            self.serve()
+        self._watcher.start()
+
+    def stop(self, failed: bool = False) -> None:
+        """Stop publishing progress, writing the final progress and the run's root span"""
+        self.finished_at = time.time()
+        self._stop_watching.set()
+        if self._watcher.is_alive():
+            self._watcher.join()
+        self.write_progress()
+        self.write_span(self.span(
+            self.root_span_id, None, "dbt run", self.started_at, self.finished_at,
+            {"dbt.nodes": len(self.nodes)}, failed,
+        ))
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+""" Classes for splitting a DBT project across the pods of a Kubernetes Indexed Job. The partition is
+computed from the manifest of the project being run, weighted by a previous run's node execution times,
+and is deterministic so every pod computes the same plan independently. Each pod builds only its shard, in
+waves: a node never runs before the upstream nodes of other shards that it depends on have been built,
+since every pod waits at a barrier until all shards have finished the previous wave """
+
+import json
+import os
+import time
+from typing import Dict, List
+
+# Resource types that are assigned to shards. Tests follow the nodes they test
+SHARDED_RESOURCE_TYPES = ("model", "seed", "snapshot")
+WAVE_POLL_SECONDS = 1.0
+
+
+def load_json(path: str) -> dict:
+    """Load a dbt artifact (manifest.json, run_results.json) from disk"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_runtimes(run_results: dict) -> Dict[str, float]:
+    """Get the execution time of each node in a dbt run_results.json"""
+    return {result["unique_id"]: result.get("execution_time") or 0.0 for result in run_results.get("results", [])}
+
+
+def merge_run_results(shard_results: List[dict]) -> dict:
+    """Merge the run_results.json of every shard into a single run_results.json for the whole run"""
+    if not shard_results:
+        return {"results": []}
+    merged = dict(shard_results[0])
+    merged["results"] = sorted(
+        (result for run_results in shard_results for result in run_results.get("results", [])),
+        key=lambda result: result["unique_id"],
+    )
+    merged["elapsed_time"] = max(run_results.get("elapsed_time", 0.0) for run_results in shard_results)
+    return merged
+
+
+class ShardPlanner:
+    """
+    Object representing a dependency-aware partition of a dbt manifest. Connected groups of nodes
+    no heavier than a shard's fair share are kept whole on one shard. Heavier groups are split by
+    dependency depth: all their nodes at the same depth run in the same wave, spread across every
+    shard by weight, so a wide project keeps every shard busy in every wave
+    """
+
+    def __init__(self, manifest: dict, runtimes: Dict[str, float] = None, default_runtime: float = 1.0):
+        self.runtimes = runtimes or {}
+        self.default_runtime = default_runtime
+        nodes = manifest.get("nodes", {})
+        self.nodes = {
+            unique_id: node for unique_id, node in nodes.items()
+            if node.get("resource_type") in SHARDED_RESOURCE_TYPES
+        }
+        self.parents = {
+            unique_id: sorted(parent for parent in node.get("depends_on", {}).get("nodes", []) if parent in self.nodes)
+            for unique_id, node in self.nodes.items()
+        }
+
+        # Weigh each node by its last runtime plus the runtime of the tests attached to it
+        self.weights = {unique_id: self.runtime(unique_id) for unique_id in self.nodes}
+        for unique_id, node in sorted(nodes.items()):
+            if node.get("resource_type") == "test":
+                tested = [parent for parent in node.get("depends_on", {}).get("nodes", []) if parent in self.nodes]
+                if tested:
+                    self.weights[sorted(tested)[0]] += self.runtime(unique_id)
+
+    def runtime(self, unique_id: str) -> float:
+        """Get the historical runtime of a node, or the default runtime if it has none"""
+        runtime = self.runtimes.get(unique_id)
+        return runtime if runtime else self.default_runtime
+
+    def components(self) -> List[List[str]]:
+        """Get the weakly connected groups of nodes, each sorted by unique id"""
+        root = {unique_id: unique_id for unique_id in self.nodes}
+
+        def find(unique_id: str) -> str:
+            while root[unique_id] != unique_id:
+                root[unique_id] = root[root[unique_id]]
+                unique_id = root[unique_id]
+            return unique_id
+
+        for unique_id, parents in self.parents.items():
+            for parent in parents:
+                a, b = sorted((find(unique_id), find(parent)))
+                root[b] = a
+
+        groups = {}
+        for unique_id in sorted(self.nodes):
+            groups.setdefault(find(unique_id), []).append(unique_id)
+        return sorted(groups.values())
+
+    def topological_order(self, group: List[str]) -> List[str]:
+        """Order a group of nodes so parents come before children, breaking ties by unique id"""
+        members = set(group)
+        remaining = {unique_id: len([p for p in self.parents[unique_id] if p in members]) for unique_id in group}
+        children = {}
+        for unique_id in group:
+            for parent in self.parents[unique_id]:
+                if parent in members:
+                    children.setdefault(parent, []).append(unique_id)
+
+        ready = sorted(unique_id for unique_id, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            unique_id = ready.pop(0)
+            order.append(unique_id)
+            for child in children.get(unique_id, []):
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+            ready.sort()
+        return order
+
+    def levels(self, group: List[str]) -> Dict[str, int]:
+        """Get the dependency depth of each node in a group: 0 for nodes without parents, otherwise one more
+        than the deepest parent. Nodes at the same depth never depend on each other"""
+        levels = {}
+        for unique_id in self.topological_order(group):
+            levels[unique_id] = max((levels[parent] + 1 for parent in self.parents[unique_id]), default=0)
+        return levels
+
+    def partition(self, shard_count: int) -> List[dict]:
+        """Partition the manifest into shard_count shards. Returns each shard's index, nodes, expected weight
+        and the nodes it runs in each wave. Every shard has the same number of waves, some possibly empty"""
+        if shard_count < 1:
+            raise ValueError(f"Shard count must be at least 1, got {shard_count}")
+        target = sum(self.weights.values()) / shard_count
+        small, levels = [], {}
+        for group in self.components():
+            if sum(self.weights[unique_id] for unique_id in group) <= target:
+                small.append(group)
+            else:
+                levels.update(self.levels(group))
+        wave_count = max(levels.values(), default=0) + 1
+        shards = [
+            {"index": index, "nodes": [], "weight": 0.0, "waves": [[] for _ in range(wave_count)]}
+            for index in range(shard_count)
+        ]
+        # Work per wave and shard. Each wave ends at a barrier, so a run takes the sum of every wave's busiest shard
+        load = [[0.0] * shard_count for _ in range(wave_count)]
+
+        def place(nodes: List[str], wave: int, shard: dict) -> None:
+            weight = sum(self.weights[unique_id] for unique_id in nodes)
+            shard["nodes"].extend(nodes)
+            shard["waves"][wave].extend(nodes)
+            shard["weight"] += weight
+            load[wave][shard["index"]] += weight
+
+        # Heavy groups are spread by depth: every node at depth n runs in wave n, heaviest first onto the shard
+        # with the least work in that wave (then overall)
+        for wave in range(wave_count):
+            for unique_id in sorted((uid for uid, level in levels.items() if level == wave),
+                                    key=lambda uid: (-self.weights[uid], uid)):
+                shard = min(shards, key=lambda candidate: (
+                    load[wave][candidate["index"]], candidate["weight"], candidate["index"]))
+                place([unique_id], wave, shard)
+
+        # Groups that fit a shard have no dependencies outside themselves, so each is placed whole, heaviest first,
+        # where it lengthens its wave the least
+        for group in sorted(small, key=lambda group: (-sum(self.weights[uid] for uid in group), group[0])):
+            weight = sum(self.weights[unique_id] for unique_id in group)
+            wave, shard = min(
+                ((wave, shard) for wave in range(wave_count) for shard in shards),
+                key=lambda slot: (
+                    max(0.0, load[slot[0]][slot[1]["index"]] + weight - max(load[slot[0]])),
+                    load[slot[0]][slot[1]["index"]], slot[1]["weight"], slot[0], slot[1]["index"]))
+            place(group, wave, shard)
+
+        for shard in shards:
+            shard["nodes"].sort()
+            for nodes in shard["waves"]:
+                nodes.sort()
+            shard["weight"] = round(shard["weight"], 3)
+        return shards
+
+    @staticmethod
+    def makespan(shards: List[dict], weights: Dict[str, float]) -> float:
+        """Get the expected runtime of a partition: the sum over waves of the busiest shard's work in that wave"""
+        return sum(
+            max(sum(weights[unique_id] for unique_id in shard["waves"][wave]) for shard in shards)
+            for wave in range(len(shards[0]["waves"]))
+        )
+
+    def selector(self, nodes: List[str]) -> str:
+        """Get the dbt --select arguments for a list of nodes. A dotted fqn alone also selects every node under
+        a folder of the same name, so each node is selected as the intersection of its file and its fqn"""
+        selectors = []
+        for unique_id in sorted(nodes):
+            node = self.nodes[unique_id]
+            fqn = f"fqn:{'.'.join(node['fqn'])}"
+            path = node.get("original_file_path")
+            selectors.append(f"path:{path},{fqn}" if path else fqn)
+        return " ".join(selectors)
+
+
+def publish_wave(shard_path: str, wave: int, exit_code: int) -> None:
+    """Record that a shard has finished a wave, with the exit code of its DBT command for that wave"""
+    os.makedirs(shard_path, exist_ok=True)
+    marker = os.path.join(shard_path, f"WAVE-{wave}")
+    with open(f"{marker}.tmp", 'w') as f:
+        f.write(str(exit_code))
+    os.replace(f"{marker}.tmp", marker)
+
+
+def wait_for_wave(run_path: str, shard_count: int, wave: int, timeout: float) -> Dict[int, int]:
+    """Wait until every shard has finished a wave. Returns the exit code of each shard for that wave.
+    Raises TimeoutError if some shards have not finished it within the timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        exit_codes = {}
+        for index in range(shard_count):
+            try:
+                with open(os.path.join(run_path, f"shard-{index}", f"WAVE-{wave}"), 'r') as f:
+                    exit_codes[index] = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                continue
+        if len(exit_codes) == shard_count:
+            return exit_codes
+        if time.monotonic() >= deadline:
+            missing = sorted(set(range(shard_count)) - set(exit_codes))
+            raise TimeoutError(f"Shards {missing} did not finish wave {wave} within {timeout}s")
+        time.sleep(WAVE_POLL_SECONDS)
+
+
+def claim_finalizer(artifacts_path: str, shard_count: int) -> bool:
+    """Check whether every shard has published its artifacts and, if so, claim the job of merging them.
+    Exactly one shard wins the claim, whichever finishes last"""
+    done = [os.path.isfile(os.path.join(artifacts_path, f"shard-{index}", "DONE")) for index in range(shard_count)]
+    if not all(done):
+        return False
+    try:
+        os.close(os.open(os.path.join(artifacts_path, "FINALIZER"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
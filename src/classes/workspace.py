@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+""" Class representing the workspace a DBT package is placed and run in. Small packages can be run from
+a RAM backed tmpfs (/dev/shm), so extraction, compiled SQL and log writes avoid the container's overlay
+filesystem. The workspace falls back to disk whenever the package size is unknown or does not fit """
+
+import os
+import shutil
+from typing import Optional
+
+from src.classes.logger import DBTLogger
+from src.classes.monitor import cgroup_memory_limit
+
+WORKSPACE_MODES = ("auto", "disk", "memory")
+WORKSPACE_DIR = "dbt_download"
+# A run writes compiled and run copies of the project's SQL plus manifest and logs next to the package itself
+WORKSPACE_GROWTH_FACTOR = 3
+# tmpfs pages are charged to the container's memory, so the workspace may only take a share of the cgroup limit
+CGROUP_WORKSPACE_RATIO = 0.25
+MB = 1024 * 1024
+
+
+class Workspace:
+    """
+    Object representing the folder DBT packages are extracted into. In auto mode a package is placed on tmpfs
+    when its estimated workspace footprint fits the memory budget, the free space on the tmpfs mount and a
+    share of the container's memory limit, and on disk otherwise
+    """
+
+    def __init__(
+        self,
+        root: str = ".",
+        mode: str = "auto",
+        memory_path: str = "/dev/shm",
+        memory_budget_mb: float = 256,
+        run_id: str = None,
+        logger: DBTLogger = None,
+    ):
+        if mode not in WORKSPACE_MODES:
+            raise ValueError(f"Unsupported workspace mode: {mode} (expected one of {', '.join(WORKSPACE_MODES)})")
+        self.root = root or "."
+        self.mode = mode
+        self.memory_path = memory_path
+        self.memory_budget = memory_budget_mb * MB
+        self.run_id = run_id
+        self.logger = logger or DBTLogger()
+
+        self.used = "disk"
+        self.path = os.path.normpath(os.path.join(self.root, WORKSPACE_DIR))
+        self.package_bytes = None
+        self.estimated_bytes = None
+        self.reason = None
+
+    def memory_available(self) -> Optional[int]:
+        """Get the bytes a memory workspace may use, or None if the tmpfs mount does not exist"""
+        if not os.path.isdir(self.memory_path):
+            return None
+        available = min(self.memory_budget, shutil.disk_usage(self.memory_path).free)
+        cgroup_limit = cgroup_memory_limit()
+        if cgroup_limit:
+            available = min(available, cgroup_limit * CGROUP_WORKSPACE_RATIO)
+        return int(available)
+
+    def choose(self, package_bytes: Optional[int]) -> str:
+        """Choose between a memory and a disk workspace for a package of the given uncompressed size.
+        Returns the workspace path"""
+        self.package_bytes = package_bytes
+        self.estimated_bytes = package_bytes * WORKSPACE_GROWTH_FACTOR if package_bytes is not None else None
+        available = self.memory_available()
+
+        if self.mode == "disk":
+            self.reason = "workspace mode is disk"
+        elif available is None:
+            self.reason = f"{self.memory_path} does not exist"
+        elif self.mode == "memory":
+            self.used, self.reason = "memory", "workspace mode is memory"
+        elif self.estimated_bytes is None:
+            self.reason = "package size is unknown"
+        elif self.estimated_bytes > available:
+            self.reason = f"estimated {self.estimated_bytes / MB:.1f}MB exceeds {available / MB:.1f}MB of memory"
+        else:
+            self.used = "memory"
+            self.reason = f"estimated {self.estimated_bytes / MB:.1f}MB fits {available / MB:.1f}MB"
+
+        if self.used == "memory":
+            folder = f"{WORKSPACE_DIR}_{self.run_id}" if self.run_id else WORKSPACE_DIR
+            self.path = os.path.join(self.memory_path, folder)
+        os.makedirs(self.path, exist_ok=True)
+        self.logger.printlog(f"DBT workspace: {self.used} ({self.path}), {self.reason}")
+        return self.path
+
+    def cleanup(self) -> None:
+        """Remove a memory workspace, freeing the memory it holds. Disk workspaces are left in place"""
+        if self.used == "memory":
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    @property
+    def summary(self) -> dict:
+        """Get the workspace that was chosen and why, for the run report"""
+        return {
+            "mode": self.mode,
+            "used": self.used,
+            "path": self.path,
+            "package_bytes": self.package_bytes,
+            "estimated_bytes": self.estimated_bytes,
+            "memory_budget_bytes": int(self.memory_budget),
+            "reason": self.reason,
+        }
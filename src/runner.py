@@ -3,6 +3,7 @@
 """ Main DBT Runner app """
 
 import os
+import sys
 from src.classes.logger import DBTLogger
 from src.classes.pipeline import DBTPipeline
 
@@ -27,6 +28,37 @@ default_config = {
     "DBT_TARGET": None,
     "REGISTER_ASSETS": None,
     "DBT_PACKAGE_BRANCH": None,
+    "DBT_PACKAGE_MIRRORS": None,
+    "DBT_PACKAGE_SHA256": None,
+    "DBT_MIRROR_HEDGE_DELAY": "2",
+    "DBT_MIRROR_STATS_PATH": ".dbt_mirror_stats.json",
+    "DBT_PACKAGE_CACHE": "dbt_cache",
+    "DBT_MONITOR_INTERVAL": "5",
+    "DBT_MEMORY_SOFT_LIMIT_MB": None,
+    "DBT_MEMORY_HARD_LIMIT_MB": None,
+    "DBT_TERMINATION_GRACE_PERIOD": "30",
+    "DBT_RESOURCE_TIMESERIES": "resource_timeseries.jsonl",
+    "DBT_RUN_REPORT": "run_report.json",
+    "DBT_SHARD_COUNT": None,
+    "JOB_COMPLETION_INDEX": None,
+    "DBT_SHARD_STATE_PATH": "dbt_state",
+    "DBT_SHARD_ARTIFACTS_PATH": "dbt_shards",
+    "DBT_SHARD_WAVE_TIMEOUT": "3600",
+    "DBT_SHARD_PARSE_COMMAND": "dbt parse --profiles-dir .",
+    "DBT_RUN_ID": None,
+    "DBT_ARTIFACTS_BUCKET": None,
+    "DBT_ARTIFACTS_PREFIX": "dbt-runs",
+    "DBT_ARTIFACTS_COMPRESSION": "gzip",
+    "DBT_ARTIFACTS_DEADLINE": "60",
+    "DBT_PROGRESS": "1",
+    "DBT_PROGRESS_PATH": "progress.json",
+    "DBT_PROGRESS_PORT": None,
+    "DBT_TRACE_SPANS_PATH": "trace_spans.jsonl",
+    "DBT_SLOW_NODE_SECONDS": "900",
+    "DBT_WORKSPACE_ROOT": ".",
+    "DBT_WORKSPACE_MODE": "auto",
+    "DBT_WORKSPACE_MEMORY_PATH": "/dev/shm",
+    "DBT_WORKSPACE_MEMORY_BUDGET_MB": "256",
 }
 
 def read_env_vars() -> dict:
@@ -61,8 +93,25 @@ def main() -> None:
     # Get service account credentials
     runner.get_credentials()
 
+    # Restrict the command to this pod's shard when running as a sharded job
+    runner.prepare_shard()
+
     # Run the specified bash command
-    runner.run_dbt_command()
+    exit_code = runner.run_dbt_command()
+
+    # Publish this shard's artifacts, merging every shard's results once all have finished
+    runner.finalize_shard()
+
+    # Record the run's exit code and resource usage
+    runner.write_run_report()
+
+    # Upload run artifacts and logs, bounded by a deadline so the exit code is not held up
+    runner.ship_artifacts()
+
+    # Free the workspace if it was held in memory
+    runner.cleanup_workspace()
+
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
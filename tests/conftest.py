@@ -7,4 +7,5 @@ Fixtures for all the tests
 pytest_plugins = [
     "tests.fixtures.aws_mock_fixtures",
     "tests.fixtures.dbt_pipeline_fixtures",
+    "tests.fixtures.http_mirror_fixtures",
 ]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Fixtures serving DBT packages from local HTTP servers with injected delays
+"""
+
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class MirrorServer:
+    """A local HTTP server that serves one payload after an injected delay and counts its requests"""
+
+    def __init__(self, payload: bytes, delay: float = 0.0):
+        self.payload = payload
+        self.delay = delay
+        self.requests = 0
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mirror.requests += 1
+                time.sleep(mirror.delay)
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(mirror.payload)))
+                    self.end_headers()
+                    self.wfile.write(mirror.payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/dbt.tar.gz"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(name='test_mirror_server')
+def mirror_server():
+    """Factory fixture starting local mirror servers: test_mirror_server(payload, delay)"""
+    servers = []
+
+    def start(payload: bytes, delay: float = 0.0) -> MirrorServer:
+        server = MirrorServer(payload, delay)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+class StaticServer:
+    """A local HTTP server that serves a folder and records the paths requested from it"""
+
+    def __init__(self, directory: str):
+        self.paths = []
+        static = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                static.paths.append(self.path)
+                super().do_GET()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(name='test_static_server')
+def static_server():
+    """Factory fixture starting local static file servers: test_static_server(directory)"""
+    servers = []
+
+    def start(directory: str) -> StaticServer:
+        server = StaticServer(directory)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
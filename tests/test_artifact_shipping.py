@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import gzip
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+
+import pytest
+
+from src.classes.artifacts import MAX_PARTS_IN_FLIGHT, MB, ArtifactShipper
+
+
+@pytest.fixture(name='test_run_folder')
+def run_folder(tmp_path):
+    """A dbt project folder holding the artifacts of a finished run"""
+    (tmp_path / "target" / "compiled" / "shop" / "models").mkdir(parents=True)
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "target" / "run_results.json").write_text(json.dumps({"results": [], "elapsed_time": 1.0}))
+    (tmp_path / "target" / "manifest.json").write_text(json.dumps({"nodes": {}}))
+    for i in range(50):
+        (tmp_path / "target" / "compiled" / "shop" / "models" / f"model_{i}.sql").write_text(f"select {i}")
+    # Incompressible so the compressed log still needs a multipart upload
+    (tmp_path / "logs" / "dbt.log").write_bytes(os.urandom(12 * MB))
+    yield tmp_path
+
+
+@pytest.mark.functional
+def test_ship_artifacts_to_s3(test_s3_bucket, test_run_folder):
+    """Tests that run artifacts are compressed, compiled SQL is batched into one tarball,
+    large logs go through a multipart upload and an index describes the upload
+    """
+    test_s3_bucket.create_bucket(Bucket="dbt-artifacts")
+    shipper = ArtifactShipper("dbt-artifacts", "dbt-runs/run-1", multipart_threshold=5 * MB, region="us-east-1")
+
+    index = shipper.ship(ArtifactShipper.collect(str(test_run_folder)))
+
+    keys = {obj["Key"] for obj in test_s3_bucket.list_objects_v2(Bucket="dbt-artifacts")["Contents"]}
+    assert index["complete"]
+    assert keys == {
+        "dbt-runs/run-1/index.json",
+        "dbt-runs/run-1/target/run_results.json.gz",
+        "dbt-runs/run-1/target/manifest.json.gz",
+        "dbt-runs/run-1/target/compiled.tar.gz",
+        "dbt-runs/run-1/logs/dbt.log.gz",
+    }
+
+    stored_index = json.loads(
+        test_s3_bucket.get_object(Bucket="dbt-artifacts", Key="dbt-runs/run-1/index.json")["Body"].read())
+    run_results = test_s3_bucket.get_object(Bucket="dbt-artifacts", Key="dbt-runs/run-1/target/run_results.json.gz")
+    compiled = test_s3_bucket.get_object(Bucket="dbt-artifacts", Key="dbt-runs/run-1/target/compiled.tar.gz")
+    with tarfile.open(fileobj=io.BytesIO(compiled["Body"].read()), mode="r:gz") as tar:
+        compiled_files = [member for member in tar.getnames() if member.endswith(".sql")]
+    assert stored_index["artifacts"] == index["artifacts"]
+    assert json.loads(gzip.decompress(run_results["Body"].read())) == {"results": [], "elapsed_time": 1.0}
+    assert len(compiled_files) == 50
+
+
+@pytest.mark.functional
+def test_ship_artifacts_respects_deadline(test_s3_bucket, test_run_folder, monkeypatch):
+    """Tests that shipping returns at the deadline, leaving slow uploads behind and marking them pending in the index"""
+    test_s3_bucket.create_bucket(Bucket="dbt-artifacts-slow")
+    monkeypatch.setattr(ArtifactShipper, "upload", lambda self, client, artifact, workdir: time.sleep(5))
+    shipper = ArtifactShipper("dbt-artifacts-slow", "dbt-runs/run-2", deadline=0.2, region="us-east-1")
+
+    started = time.monotonic()
+    index = shipper.ship(ArtifactShipper.collect(str(test_run_folder)))
+
+    stored_index = json.loads(
+        test_s3_bucket.get_object(Bucket="dbt-artifacts-slow", Key="dbt-runs/run-2/index.json")["Body"].read())
+    assert time.monotonic() - started < 2
+    assert not index["complete"]
+    assert {entry["status"] for entry in stored_index["artifacts"]} == {"pending"}
+
+
+@pytest.mark.functional
+def test_ship_artifacts_caps_parts_and_aborts_abandoned_uploads(test_s3_bucket, test_run_folder, monkeypatch):
+    """Tests that concurrent multipart parts across all uploads are capped, and that multipart uploads still
+    running at the deadline are aborted rather than left behind, without shipping outlasting the deadline
+    """
+    test_s3_bucket.create_bucket(Bucket="dbt-artifacts-abandoned")
+    for i in range(2):
+        (test_run_folder / "logs" / f"dbt_{i}.log").write_bytes(os.urandom(12 * MB))
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    class SlowParts:
+        """An S3 client whose part uploads are slow enough to still be running at the deadline"""
+
+        def __init__(self, client):
+            self.client = client
+
+        def __getattr__(self, name):
+            return getattr(self.client, name)
+
+        def upload_part(self, **kwargs):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(4)
+            with lock:
+                in_flight.pop()
+            return self.client.upload_part(**kwargs)
+
+    create_client = ArtifactShipper.client
+    monkeypatch.setattr(
+        ArtifactShipper, "client",
+        lambda self, config=None: create_client(self, config) if config else SlowParts(create_client(self)))
+    shipper = ArtifactShipper("dbt-artifacts-abandoned", "dbt-runs/run-3", deadline=5,
+                              multipart_threshold=5 * MB, region="us-east-1")
+
+    started = time.monotonic()
+    index = shipper.ship(ArtifactShipper.collect(str(test_run_folder)))
+
+    assert time.monotonic() - started < 5.5
+    assert not index["complete"]
+    assert 1 < max(peak) <= MAX_PARTS_IN_FLIGHT
+    assert not test_s3_bucket.list_multipart_uploads(Bucket="dbt-artifacts-abandoned").get("Uploads")
+    assert test_s3_bucket.get_object(Bucket="dbt-artifacts-abandoned", Key="dbt-runs/run-3/index.json")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+
+import pytest
+
+from src.classes.delta import DeltaError, DeltaPackage
+
+FIXTURE_PROJECT = os.path.join(os.path.dirname(__file__), "fixtures", "data")
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts", "make_delta_package.py")
+
+
+def load_builder():
+    spec = importlib.util.spec_from_file_location("make_delta_package", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.functional
+def test_delta_package_fetches_only_changed_files(test_static_server, tmp_path):
+    """Tests that the first fetch of a delta package downloads every file, and that after a
+    single model changes the next fetch downloads only that file's object
+    """
+    builder = load_builder()
+    project = tmp_path / "src"
+    shutil.copytree(FIXTURE_PROJECT, project)
+    published = tmp_path / "published"
+    server = test_static_server(str(published))
+    manifest_url = f"{server.url}/manifest.json"
+    cache = tmp_path / "cache"
+
+    manifest = builder.build(str(project), "dbt_tester", str(published))
+    stats = DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "first"))
+    assert stats["fetched"] == len(manifest["files"])
+
+    model = project / "dbt_tester" / "models" / "testmodel" / "testmodel_1.sql"
+    model.write_text(model.read_text() + "\n-- changed\n")
+    manifest = builder.build(str(project), "dbt_tester", str(published))
+    server.paths.clear()
+    stats = DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "second"))
+
+    changed_digest = manifest["files"]["dbt_tester/models/testmodel/testmodel_1.sql"]["sha256"]
+    assert stats["fetched"] == 1
+    assert stats["reused"] == len(manifest["files"]) - 1
+    assert server.paths == ["/manifest.json", f"/objects/{changed_digest}"]
+    assert (tmp_path / "second" / "dbt_tester" / "models" / "testmodel" / "testmodel_1.sql").read_text() == \
+        model.read_text()
+
+
+@pytest.mark.functional
+def test_delta_package_verifies_digests(test_static_server, tmp_path):
+    """Tests that a manifest not matching the expected sha256, or an object not matching
+    its manifest hash, is rejected
+    """
+    builder = load_builder()
+    published = tmp_path / "published"
+    manifest = builder.build(FIXTURE_PROJECT, "dbt_tester", str(published))
+    server = test_static_server(str(published))
+    manifest_url = f"{server.url}/manifest.json"
+
+    with pytest.raises(DeltaError):
+        DeltaPackage(manifest_url, str(tmp_path / "cache"), expected_sha256="0" * 64).fetch(str(tmp_path / "out"))
+
+    manifest_sha256 = hashlib.sha256((published / "manifest.json").read_bytes()).hexdigest()
+    digest = manifest["files"]["dbt_tester/dbt_project.yml"]["sha256"]
+    (published / "objects" / digest).write_text("tampered")
+    with pytest.raises(DeltaError):
+        DeltaPackage(manifest_url, str(tmp_path / "cache"), manifest_sha256).fetch(str(tmp_path / "out"))
+
+
+@pytest.mark.functional
+def test_delta_package_workspace_writes_leave_cache_intact(test_static_server, tmp_path):
+    """Tests that writes to the placed project do not change the cached files reused by the next fetch,
+    that a malformed manifest is reported as a DeltaError and that a corrupted cached manifest is ignored
+    """
+    builder = load_builder()
+    published = tmp_path / "published"
+    builder.build(FIXTURE_PROJECT, "dbt_tester", str(published))
+    server = test_static_server(str(published))
+    manifest_url = f"{server.url}/manifest.json"
+    cache = tmp_path / "cache"
+
+    DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "first"))
+    placed = tmp_path / "first" / "dbt_tester" / "dbt_project.yml"
+    original = placed.read_text()
+    # An in-place write that keeps the file size, which the cache's size check cannot notice
+    with open(placed, 'r+') as f:
+        f.write("#" * len(original))
+    os.chmod(placed, 0o700)
+
+    DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "second"))
+    assert (tmp_path / "second" / "dbt_tester" / "dbt_project.yml").read_text() == original
+
+    published_manifest = (published / "manifest.json").read_text()
+    (published / "manifest.json").write_text("{not json")
+    with pytest.raises(DeltaError):
+        DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "third"))
+    digest = "0" * 64
+    for manifest in ({}, {"files": {"dbt_tester/a.sql": {"size": 3}}}, {"files": {"dbt_tester/a.sql": "a"}},
+                     {"files": {"dbt_tester/a.sql": {"sha256": "../../secret", "size": 3}}},
+                     {"files": {"dbt_tester/a.sql": {"sha256": digest, "size": -1}}},
+                     {"files": {"dbt_tester/a.sql": {"sha256": digest, "size": 3, "mode": "rwx"}}},
+                     {"files": {"../a.sql": {"sha256": digest, "size": 3}}}):
+        (published / "manifest.json").write_text(json.dumps(manifest))
+        with pytest.raises(DeltaError):
+            DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "third"))
+
+    # A corrupted cached manifest is treated as an empty cache
+    (cache / "manifest.json").write_text(json.dumps({"files": {"dbt_tester/a.sql": {"size": 3}}}))
+    assert DeltaPackage(manifest_url, str(cache)).cached_manifest() is None
+    (published / "manifest.json").write_text(published_manifest)
+    stats = DeltaPackage(manifest_url, str(cache)).fetch(str(tmp_path / "fourth"))
+    assert stats["fetched"] == stats["files"]
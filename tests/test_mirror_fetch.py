@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import threading
+import time
+
+import pytest
+
+from src.classes.mirrors import MirrorError, MirrorFetcher, MirrorStats
+
+PAYLOAD = b"dbt package contents" * 1024
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+@pytest.mark.functional
+def test_hedged_fetch_prefers_fast_mirror(test_mirror_server, tmp_path):
+    """Tests that a slow first mirror is hedged with a second one after the hedge delay,
+    that the fast mirror's download wins and that both latencies are recorded
+    """
+    slow = test_mirror_server(PAYLOAD, delay=3.0)
+    fast = test_mirror_server(PAYLOAD)
+    stats_path = tmp_path / "stats.json"
+    fetcher = MirrorFetcher([slow.url, fast.url], PAYLOAD_SHA256, hedge_delay=0.2, stats_path=str(stats_path))
+
+    url = fetcher.fetch(str(tmp_path / "dbt.tar.gz"))
+
+    stats = json.loads(stats_path.read_text())
+    assert url == fast.url
+    assert (tmp_path / "dbt.tar.gz").read_bytes() == PAYLOAD
+    assert slow.requests == 1
+    assert stats[fast.url]["latency"] < stats[slow.url]["latency"]
+
+
+@pytest.mark.functional
+def test_fetch_starts_with_historically_fastest_mirror(test_mirror_server, tmp_path):
+    """Tests that recorded latency statistics decide which mirror is requested first"""
+    primary = test_mirror_server(PAYLOAD)
+    secondary = test_mirror_server(PAYLOAD)
+    stats_path = tmp_path / "stats.json"
+    stats_path.write_text(json.dumps({
+        primary.url: {"latency": 5.0, "samples": 3, "failures": 0},
+        secondary.url: {"latency": 0.01, "samples": 3, "failures": 0},
+    }))
+    fetcher = MirrorFetcher([primary.url, secondary.url], hedge_delay=1.0, stats_path=str(stats_path))
+
+    url = fetcher.fetch(str(tmp_path / "dbt.tar.gz"))
+
+    assert url == secondary.url
+    assert primary.requests == 0
+
+
+@pytest.mark.functional
+def test_fetch_skips_mirror_with_wrong_digest(test_mirror_server, tmp_path):
+    """Tests that a mirror serving content that does not match the expected digest is
+    rejected and the package is fetched from the next mirror
+    """
+    corrupt = test_mirror_server(b"corrupt package")
+    good = test_mirror_server(PAYLOAD, delay=0.1)
+    fetcher = MirrorFetcher([corrupt.url, good.url], PAYLOAD_SHA256, hedge_delay=1.0)
+
+    url = fetcher.fetch(str(tmp_path / "dbt.tar.gz"))
+
+    assert url == good.url
+    assert (tmp_path / "dbt.tar.gz").read_bytes() == PAYLOAD
+
+    with pytest.raises(MirrorError):
+        MirrorFetcher([corrupt.url], PAYLOAD_SHA256, hedge_delay=1.0).fetch(str(tmp_path / "dbt.tar.gz"))
+
+
+@pytest.mark.functional
+def test_cancelled_hedge_is_aborted_and_not_ranked_fastest(test_mirror_server, tmp_path):
+    """Tests that a hedge cancelled before producing bytes has its request aborted and is recorded as no faster
+    than the winner plus the hedge delay, so it is not ranked above the winner on the next run
+    """
+    primary = test_mirror_server(PAYLOAD, delay=0.3)
+    secondary = test_mirror_server(PAYLOAD, delay=5.0)
+    stats_path = tmp_path / "stats.json"
+    fetcher = MirrorFetcher([primary.url, secondary.url], PAYLOAD_SHA256, hedge_delay=0.2, stats_path=str(stats_path))
+
+    url = fetcher.fetch(str(tmp_path / "dbt.tar.gz"))
+
+    stats = json.loads(stats_path.read_text())
+    assert url == primary.url
+    assert secondary.requests == 1
+    assert stats[secondary.url]["latency"] >= stats[primary.url]["latency"] + 0.2
+    assert MirrorStats(str(stats_path)).order([secondary.url, primary.url]) == [primary.url, secondary.url]
+
+    # The cancelled attempt must not stay blocked waiting for the slow mirror's response
+    deadline = time.monotonic() + 2.0
+    while time.monotonic() < deadline and any(t.name == f"mirror-{secondary.url}" for t in threading.enumerate()):
+        time.sleep(0.05)
+    assert not any(thread.name == f"mirror-{secondary.url}" for thread in threading.enumerate())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+from src.classes.archive import ArchiveError, detect_format, extract_package
+from tests.fixtures.helpers import make_tarfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DATA = os.path.join(REPO_ROOT, "tests", "fixtures", "data")
+
+
+def tar_bytes(source_dir: str) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(source_dir, arcname=os.path.basename(source_dir))
+    return buffer.getvalue()
+
+
+@pytest.mark.functional
+def test_detect_and_extract_gzip_package(tmp_path):
+    """Tests that a gzip package is detected from its magic bytes regardless of its file name"""
+    package = tmp_path / "package.bin"
+    make_tarfile(str(package), os.path.join(FIXTURE_DATA, "dbt_tester"))
+
+    assert detect_format(str(package)) == "gzip"
+    assert extract_package(str(package), str(tmp_path / "out")) == "gzip"
+    assert (tmp_path / "out" / "dbt_tester" / "dbt_project.yml").is_file()
+
+    (tmp_path / "not_a_package").write_bytes(b"not a package")
+    with pytest.raises(ArchiveError):
+        detect_format(str(tmp_path / "not_a_package"))
+
+
+@pytest.mark.functional
+def test_detect_and_extract_zstd_package(tmp_path):
+    """Tests that a zstd compressed package is detected and extracted"""
+    zstandard = pytest.importorskip("zstandard")
+    package = tmp_path / "package.bin"
+    package.write_bytes(zstandard.ZstdCompressor().compress(tar_bytes(os.path.join(FIXTURE_DATA, "dbt_tester"))))
+
+    assert extract_package(str(package), str(tmp_path / "out")) == "zstd"
+    assert (tmp_path / "out" / "dbt_tester" / "dbt_project.yml").is_file()
+
+
+@pytest.mark.functional
+def test_detect_and_extract_lz4_package(tmp_path):
+    """Tests that an lz4 frame compressed package is detected and extracted"""
+    lz4_frame = pytest.importorskip("lz4.frame")
+    package = tmp_path / "package.bin"
+    package.write_bytes(lz4_frame.compress(tar_bytes(os.path.join(FIXTURE_DATA, "dbt_tester"))))
+
+    assert extract_package(str(package), str(tmp_path / "out")) == "lz4"
+    assert (tmp_path / "out" / "dbt_tester" / "dbt_project.yml").is_file()
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("package_format, extension", [("gzip", "tar.gz"), ("zstd", "tar.zst")])
+def test_tar_my_dbt_is_reproducible(tmp_path, package_format, extension):
+    """Tests that packing the same project twice, with different file mtimes and permission bits from a different
+    umask, produces identical bytes that keep scripts executable
+    """
+    if package_format == "zstd" and not shutil.which("zstd"):
+        pytest.skip("zstd CLI not installed")
+    shutil.copytree(os.path.join(FIXTURE_DATA, "dbt_tester"), tmp_path / "src" / "dbt_tester")
+    script = os.path.join(REPO_ROOT, "scripts", "tar_my_dbt.sh")
+
+    digests = []
+    project = tmp_path / "src" / "dbt_tester"
+    for attempt in range(2):
+        os.utime(project / "dbt_project.yml", (attempt * 1000, attempt * 1000))
+        os.chmod(project / "dbt_project.yml", (0o644, 0o664)[attempt])
+        os.chmod(project / "models", (0o755, 0o775)[attempt])
+        os.chmod(project / "run_dbt.sh", (0o755, 0o775)[attempt])
+        subprocess.run(["bash", script, "-c", str(tmp_path / "src"), "-s", "dbt_tester", "-f", package_format],
+                       cwd=tmp_path, check=True, capture_output=True)
+        digests.append(hashlib.sha256((tmp_path / f"dbt_tester.{extension}").read_bytes()).hexdigest())
+
+    assert digests[0] == digests[1]
+    assert detect_format(str(tmp_path / f"dbt_tester.{extension}")) == package_format
+    extract_package(str(tmp_path / f"dbt_tester.{extension}"), str(tmp_path / "out"))
+    assert os.stat(tmp_path / "out" / "dbt_tester" / "run_dbt.sh").st_mode & 0o777 == 0o755
+    assert os.stat(tmp_path / "out" / "dbt_tester" / "dbt_project.yml").st_mode & 0o777 == 0o644
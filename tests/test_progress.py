@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import urllib.request
+
+import pytest
+
+from src.classes.progress import ProgressTracker, with_json_logs
+
+
+def legacy_event(unique_id: str, status: str, msg: str = "") -> str:
+    """A dbt 1.0 - 1.3 JSON log line"""
+    return json.dumps({"code": "Q033", "msg": msg, "node_info": {
+        "unique_id": unique_id, "node_name": unique_id.split(".")[-1], "resource_type": "model",
+        "node_status": status, "node_finished_at": "", "node_started_at": ""}})
+
+
+def event(unique_id: str, status: str, msg: str = "") -> str:
+    """A dbt 1.4+ JSON log line"""
+    return json.dumps({"info": {"name": "NodeFinished", "msg": msg}, "data": {"node_info": {
+        "unique_id": unique_id, "node_name": unique_id.split(".")[-1], "resource_type": "model",
+        "node_status": status}}})
+
+
+@pytest.mark.functional
+def test_with_json_logs():
+    """Tests that every direct dbt invocation in a shell command gets the JSON log flag"""
+    assert with_json_logs("dbt deps --profiles-dir . && dbt run --profiles-dir .") == \
+        "dbt --log-format json deps --profiles-dir . && dbt --log-format json run --profiles-dir ."
+    assert with_json_logs("./run_dbt.sh") == "./run_dbt.sh"
+
+
+@pytest.mark.functional
+def test_progress_is_published_while_running(tmp_path):
+    """Tests that node state is available in the progress file and over HTTP while a node is still running,
+    that slow nodes are alerted and that finished nodes are written as OTLP JSON spans
+    """
+    progress_path = tmp_path / "progress.json"
+    spans_path = tmp_path / "spans.jsonl"
+    tracker = ProgressTracker(str(progress_path), str(spans_path), slow_node_seconds=0.1, port=0, interval=0.05)
+    tracker.start()
+
+    assert tracker.handle_line("plain output\n") == "plain output"
+    assert tracker.handle_line(legacy_event("model.shop.orders", "started", "1 of 2 START orders")) == \
+        "1 of 2 START orders"
+    tracker.handle_line(event("model.shop.customers", "executing"))
+    tracker.handle_line(event("model.shop.customers", "success", "2 of 2 OK customers"))
+    time.sleep(0.3)
+
+    mid_run = json.loads(progress_path.read_text())
+    with urllib.request.urlopen(f"http://127.0.0.1:{tracker.server_port}/") as response:
+        served = json.loads(response.read())
+    assert mid_run["running"] == ["model.shop.orders"]
+    assert mid_run["nodes"]["model.shop.customers"]["status"] == "success"
+    assert served["nodes_finished"] == 1
+    assert any("Slow node model.shop.orders" in log for log in tracker.logger.logs)
+
+    tracker.handle_line(legacy_event("model.shop.orders", "error"))
+    tracker.stop(failed=True)
+
+    final = json.loads(progress_path.read_text())
+    spans = [request["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+             for request in map(json.loads, spans_path.read_text().splitlines())]
+    root = spans[-1]
+    assert final["running"] == []
+    assert final["nodes_failed"] == 1
+    assert final["nodes"]["model.shop.orders"]["duration_seconds"] >= 0.3
+    assert [span["name"] for span in spans] == ["customers", "orders", "dbt run"]
+    assert all(span["traceId"] == root["traceId"] and span["parentSpanId"] == root["spanId"] for span in spans[:-1])
+    assert spans[1]["status"]["code"] == 2
+
+
+@pytest.mark.functional
+def test_undecodable_or_unparsable_output_keeps_exit_code(tmp_path, monkeypatch, capfd):
+    """Tests that output which is not valid UTF-8, or which the tracker fails on, never hides the command's
+    own exit code or leaves the command running
+    """
+    from src.classes.pipeline import DBTPipeline
+    from src.runner import default_config
+
+    monkeypatch.setenv("DBT_PASS", "AlreadySetPassword")
+    project = tmp_path / "project"
+    project.mkdir()
+    config = dict(
+        default_config,
+        DBT_PATH=str(project),
+        DBT_COMMAND="printf 'caf\\351\\n'; printf 'after\\n'; exit 3",
+        DBT_PROGRESS_PATH=str(tmp_path / "progress.json"),
+        DBT_TRACE_SPANS_PATH=str(tmp_path / "spans.jsonl"),
+        DBT_RESOURCE_TIMESERIES=str(tmp_path / "timeseries.jsonl"),
+    )
+    pipeline = DBTPipeline(config)
+    assert pipeline.run_dbt_command() == 3
+    assert pipeline.run_report["exit_code"] == 3
+    assert "caf�" in capfd.readouterr().out
+
+    def fail(self, line):
+        raise RuntimeError("tracker failure")
+
+    monkeypatch.setattr(ProgressTracker, "handle_line", fail)
+    pipeline = DBTPipeline(config)
+    assert pipeline.run_dbt_command() == 3
+    assert "after" in capfd.readouterr().out
+    assert json.loads((tmp_path / "progress.json").read_text())["running"] == []
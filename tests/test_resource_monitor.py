@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from src.classes import monitor as monitor_module
+from src.classes.monitor import MB, ResourceMonitor
+
+
+def spawn_tree(megabytes: int, seconds: float) -> subprocess.Popen:
+    """Spawn a shell whose python child holds the given amount of memory for the given time"""
+    child = f"import time; data = b'x' * ({megabytes} * 1024 * 1024); time.sleep({seconds})"
+    return subprocess.Popen([f'"{sys.executable}" -c "{child}"; true'], shell=True, start_new_session=True)
+
+
+@pytest.mark.functional
+def test_monitor_records_peak_usage_of_process_tree(tmp_path):
+    """Tests that memory held by a grandchild of the monitored process is sampled, and that
+    the peak usage and time series are recorded
+    """
+    timeseries = tmp_path / "timeseries.jsonl"
+    process = spawn_tree(64, 1.0)
+    monitor = ResourceMonitor(process.pid, interval=0.05, timeseries_path=str(timeseries))
+    monitor.start()
+    process.wait()
+    monitor.stop()
+
+    summary = monitor.summary
+    points = [json.loads(line) for line in timeseries.read_text().splitlines()]
+    assert summary["peak_rss_bytes"] >= 64 * MB
+    assert summary["peak_processes"] >= 2
+    assert not summary["terminated_for_memory"]
+    assert len(points) == summary["samples"]
+    assert max(point["rss_bytes"] for point in points) == summary["peak_rss_bytes"]
+
+
+@pytest.mark.functional
+def test_monitor_terminates_tree_over_hard_limit():
+    """Tests that a process tree over the hard memory limit is warned about and then terminated"""
+    process = spawn_tree(128, 30)
+    monitor = ResourceMonitor(process.pid, interval=0.05, soft_limit_mb=16, hard_limit_mb=32, grace_period=5)
+    started = time.monotonic()
+    monitor.start()
+    returncode = process.wait(timeout=20)
+    monitor.stop()
+
+    summary = monitor.summary
+    assert time.monotonic() - started < 20
+    assert returncode != 0
+    assert summary["soft_limit_exceeded"]
+    assert summary["terminated_for_memory"]
+
+
+@pytest.mark.functional
+def test_monitor_limits_leave_out_reserved_memory(monkeypatch):
+    """Tests that limits derived from the cgroup limit leave out memory reserved for a tmpfs workspace,
+    and that configured limits are used as given
+    """
+    monkeypatch.setattr(monitor_module, "cgroup_memory_limit", lambda: 1000 * MB)
+    assert ResourceMonitor(1).soft_limit == 800 * MB
+    reserved = ResourceMonitor(1, reserved_bytes=200 * MB)
+    assert reserved.soft_limit == 640 * MB
+    assert reserved.hard_limit == 760 * MB
+    configured = ResourceMonitor(1, soft_limit_mb=100, hard_limit_mb=200, reserved_bytes=200 * MB)
+    assert configured.hard_limit == 200 * MB
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+import copy
+import json
+import os
+import random
+
+import pytest
+
+from src.classes.sharding import (ShardPlanner, claim_finalizer, load_json, load_runtimes, merge_run_results,
+                                  publish_wave, wait_for_wave)
+
+MANIFESTS = os.path.join(os.path.dirname(__file__), "fixtures", "data", "manifests")
+
+
+def fan_out_fan_in_manifest(width: int) -> dict:
+    """A manifest with one seed fanned out to width staging models, joined pairwise into width / 2
+    intermediate models and fanned back in to a single mart"""
+    def node(unique_id: str, parents: list) -> dict:
+        return {"resource_type": unique_id.split(".")[0], "fqn": ["shop", unique_id.split(".")[-1]],
+                "depends_on": {"nodes": parents}}
+
+    staging = [f"model.shop.stg_{i:02}" for i in range(width)]
+    intermediate = [f"model.shop.int_{i:02}" for i in range(width // 2)]
+    nodes = {"seed.shop.raw_events": node("seed.shop.raw_events", [])}
+    nodes.update({unique_id: node(unique_id, ["seed.shop.raw_events"]) for unique_id in staging})
+    nodes.update({unique_id: node(unique_id, staging[2 * i:2 * i + 2]) for i, unique_id in enumerate(intermediate)})
+    nodes["model.shop.mart"] = node("model.shop.mart", intermediate)
+    return {"nodes": nodes}
+
+
+@pytest.fixture(name='test_manifest')
+def manifest():
+    return load_json(os.path.join(MANIFESTS, "manifest.json"))
+
+
+@pytest.fixture(name='test_runtimes')
+def runtimes():
+    return load_runtimes(load_json(os.path.join(MANIFESTS, "run_results.json")))
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("shard_count", [1, 2, 3, 5, 30])
+def test_partition_assigns_every_node_once(test_manifest, test_runtimes, shard_count):
+    """Tests that every model, seed and snapshot is assigned to exactly one shard and tests are not"""
+    shards = ShardPlanner(test_manifest, test_runtimes).partition(shard_count)
+    assigned = [unique_id for shard in shards for unique_id in shard["nodes"]]
+    expected = [uid for uid, node in test_manifest["nodes"].items() if node["resource_type"] != "test"]
+
+    assert len(shards) == shard_count
+    assert sorted(assigned) == sorted(expected)
+
+
+@pytest.mark.functional
+def test_partition_is_deterministic(test_manifest, test_runtimes):
+    """Tests that the partition does not depend on the order of the manifest, so every pod computes the same plan"""
+    shuffled_nodes = list(test_manifest["nodes"].items())
+    random.Random(7).shuffle(shuffled_nodes)
+    shuffled = dict(test_manifest, nodes=dict(shuffled_nodes))
+
+    assert ShardPlanner(test_manifest, test_runtimes).partition(3) == \
+        ShardPlanner(shuffled, test_runtimes).partition(3)
+
+
+@pytest.mark.functional
+def test_partition_is_balanced_by_runtime(test_manifest, test_runtimes):
+    """Tests that shard weights come from historical runtimes (tests included) and are balanced
+    to within the heaviest single node
+    """
+    planner = ShardPlanner(test_manifest, test_runtimes)
+    shards = planner.partition(3)
+    total = sum(planner.weights.values())
+
+    assert planner.weights["model.shop.orders"] == 23.0
+    assert planner.weights["model.shop.never_run"] == planner.default_runtime
+    assert sum(shard["weight"] for shard in shards) == pytest.approx(total)
+    assert max(shard["weight"] for shard in shards) <= total / 3 + max(planner.weights.values())
+
+
+@pytest.mark.functional
+def test_partition_keeps_small_lineages_together(test_manifest, test_runtimes):
+    """Tests that a connected group lighter than a shard's share stays on one shard, while a heavier
+    one is split by dependency depth
+    """
+    planner = ShardPlanner(test_manifest, test_runtimes)
+    shards = planner.partition(3)
+    shard_of = {unique_id: shard["index"] for shard in shards for unique_id in shard["nodes"]}
+    orders_lineage = ["seed.shop.raw_orders", "model.shop.stg_orders", "model.shop.orders",
+                      "model.shop.order_summary", "seed.shop.raw_customers", "model.shop.stg_customers",
+                      "model.shop.customers"]
+
+    wave_of = {unique_id: wave for shard in shards for wave, nodes in enumerate(shard["waves"]) for unique_id in nodes}
+    total = sum(planner.weights.values())
+
+    assert len({shard_of[unique_id] for unique_id in orders_lineage}) == 1
+    for group in planner.components():
+        if sum(planner.weights[unique_id] for unique_id in group) > total / 3:
+            assert {unique_id: wave_of[unique_id] for unique_id in group} == planner.levels(group)
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("shard_count", [2, 3, 5])
+def test_no_dependency_crosses_concurrent_shards(test_manifest, test_runtimes, shard_count):
+    """Tests that a node on one shard never depends on a node of another shard in the same wave or a later one,
+    so a downstream node only runs once its upstream nodes have been built and the shards have passed a barrier
+    """
+    planner = ShardPlanner(test_manifest, test_runtimes)
+    shards = planner.partition(shard_count)
+    placement = {
+        unique_id: (shard["index"], wave)
+        for shard in shards for wave, nodes in enumerate(shard["waves"]) for unique_id in nodes
+    }
+
+    assert sorted(placement) == sorted(planner.nodes)
+    assert len({len(shard["waves"]) for shard in shards}) == 1
+    for unique_id, parents in planner.parents.items():
+        shard, wave = placement[unique_id]
+        for parent in parents:
+            parent_shard, parent_wave = placement[parent]
+            if parent_shard == shard:
+                assert parent_wave <= wave
+            else:
+                assert parent_wave < wave
+
+
+@pytest.mark.functional
+def test_partition_runtime_shrinks_with_shard_count():
+    """Tests that a wide lineage is spread across all shards in every wave, so the expected runtime of a run,
+    the sum of each wave's busiest shard, falls close to the serial runtime divided by the shard count
+    """
+    planner = ShardPlanner(fan_out_fan_in_manifest(24))
+    serial = ShardPlanner.makespan(planner.partition(1), planner.weights)
+    makespans = {count: ShardPlanner.makespan(planner.partition(count), planner.weights) for count in (2, 4, 8)}
+
+    assert serial == 38
+    # One seed, 24 staging, 12 intermediate and one mart model, each wave spread over every shard
+    assert makespans == {2: 1 + 12 + 6 + 1, 4: 1 + 6 + 3 + 1, 8: 1 + 3 + 2 + 1}
+
+
+@pytest.mark.functional
+def test_selector_selects_exact_nodes(test_manifest):
+    """Tests the dbt --select arguments built for a shard: each node is the intersection of its file and its fqn,
+    since a bare fqn would also select nodes in a folder of the same name
+    """
+    planner = ShardPlanner(test_manifest)
+
+    assert planner.selector(["model.shop.orders", "seed.shop.raw_orders"]) == \
+        "path:models/marts/orders.sql,fqn:shop.marts.orders path:seeds/raw_orders.csv,fqn:shop.seeds.raw_orders"
+
+
+@pytest.mark.functional
+def test_wave_barrier(tmp_path):
+    """Tests that a wave barrier returns every shard's exit code once all shards have finished the wave,
+    and times out while any shard has not
+    """
+    publish_wave(str(tmp_path / "shard-0"), 0, 0)
+    with pytest.raises(TimeoutError):
+        wait_for_wave(str(tmp_path), 2, 0, timeout=0)
+    publish_wave(str(tmp_path / "shard-1"), 0, 2)
+    assert wait_for_wave(str(tmp_path), 2, 0, timeout=0) == {0: 0, 1: 2}
+
+
+@pytest.mark.functional
+def test_merge_and_finalize_shards(tmp_path):
+    """Tests that shard run results are merged and only the last finished shard claims the finalizer"""
+    merged = merge_run_results([
+        {"results": [{"unique_id": "model.shop.b"}], "elapsed_time": 10.0},
+        {"results": [{"unique_id": "model.shop.a"}], "elapsed_time": 30.0},
+    ])
+    assert [result["unique_id"] for result in merged["results"]] == ["model.shop.a", "model.shop.b"]
+    assert merged["elapsed_time"] == 30.0
+
+    for index in range(2):
+        (tmp_path / f"shard-{index}").mkdir()
+    (tmp_path / "shard-0" / "DONE").touch()
+    assert not claim_finalizer(str(tmp_path), 2)
+    (tmp_path / "shard-1" / "DONE").touch()
+    assert claim_finalizer(str(tmp_path), 2)
+    assert not claim_finalizer(str(tmp_path), 2)
+
+
+@pytest.mark.functional
+def test_shards_follow_the_current_project(test_manifest, tmp_path, monkeypatch):
+    """Tests that shards are computed from the parsed project rather than the state manifest, so a node added
+    since the state was recorded is built and a node whose refs changed runs after its new upstream node
+    """
+    from src.classes.pipeline import DBTPipeline
+    from src.runner import default_config
+
+    current = copy.deepcopy(test_manifest)
+    current["nodes"]["model.shop.events_monthly"] = {
+        "resource_type": "model", "fqn": ["shop", "events", "events_monthly"],
+        "original_file_path": "models/events/events_monthly.sql",
+        "depends_on": {"nodes": ["model.shop.events_daily"]},
+    }
+    current["nodes"]["model.shop.lookup_1"]["depends_on"]["nodes"] = ["model.shop.events_weekly"]
+    (tmp_path / "current.json").write_text(json.dumps(current))
+    (tmp_path / "state").mkdir()
+    (tmp_path / "state" / "manifest.json").write_text(json.dumps(test_manifest))
+    (tmp_path / "project").mkdir()
+    monkeypatch.delenv("DBT_SHARD_STATE", raising=False)
+    unique_id_of = {f"fqn:{'.'.join(node['fqn'])}": unique_id for unique_id, node in current["nodes"].items()}
+
+    placement = {}
+    for index in range(2):
+        pipeline = DBTPipeline(dict(
+            default_config,
+            DBT_PATH=str(tmp_path / "project"),
+            DBT_RUN_ID="run-1",
+            DBT_SHARD_COUNT="2",
+            JOB_COMPLETION_INDEX=str(index),
+            DBT_SHARD_STATE_PATH=str(tmp_path / "state"),
+            DBT_SHARD_ARTIFACTS_PATH=str(tmp_path / "shards"),
+            DBT_SHARD_PARSE_COMMAND=f"mkdir -p target && cp {tmp_path / 'current.json'} target/manifest.json",
+        ))
+        pipeline.prepare_shard()
+        for wave, selector in enumerate(pipeline.shard_waves):
+            for selection in (selector or "").split():
+                placement[unique_id_of[selection.split(",")[-1]]] = (index, wave)
+        assert pipeline.run_report["shard"]["new_nodes"] == 1
+        assert pipeline.shard_command("fqn:x").endswith(f"--select fqn:x --defer --state {tmp_path / 'state'}")
+
+    planner = ShardPlanner(current)
+    assert sorted(placement) == sorted(planner.nodes)
+    for unique_id, parents in planner.parents.items():
+        for parent in parents:
+            if placement[parent][0] != placement[unique_id][0]:
+                assert placement[parent][1] < placement[unique_id][1]
+            else:
+                assert placement[parent][1] <= placement[unique_id][1]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budget for src.runner, in microseconds (as reported by python -X importtime)
+RUNNER_IMPORT_BUDGET_US = 250_000
+
+# Third party libraries that only the remote package/credential backends need
+BACKEND_MODULES = ["boto3", "botocore", "pygit2", "requests"]
+
+
+def import_times(statement: str, env: dict = None) -> dict:
+    """Run a python statement with -X importtime and return the cumulative import time (us) per module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative.strip())
+    return times
+
+
+@pytest.mark.functional
+def test_runner_import_within_budget():
+    """Tests that importing the runner stays within the startup time budget
+    and does not pull in any of the remote backend libraries
+    """
+    times = import_times("import src.runner")
+    loaded_backends = [module for module in BACKEND_MODULES if module in times]
+
+    assert not loaded_backends
+    assert times["src.runner"] < RUNNER_IMPORT_BUDGET_US
+
+
+@pytest.mark.functional
+def test_mounted_package_fast_path():
+    """Tests that a locally mounted package with DBT_PASS already set never imports
+    the AWS, git or HTTP libraries while fetching code and credentials
+    """
+    env = dict(os.environ, DBT_PASS="AlreadySetPassword", DBT_CRED_TYPE="password")
+    statement = "; ".join([
+        "from src.runner import default_config",
+        "from src.classes.pipeline import DBTPipeline",
+        "runner = DBTPipeline(dict(default_config, DBT_PATH='dbt_tester'))",
+        "runner.get_dbt_code()",
+        "runner.get_credentials()",
+    ])
+    times = import_times(statement, env)
+    loaded_backends = [module for module in BACKEND_MODULES if module in times]
+
+    assert not loaded_backends
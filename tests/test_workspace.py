@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import gzip
+import os
+import struct
+
+import pytest
+
+from src.classes.archive import uncompressed_size
+from src.classes.workspace import Workspace
+from tests.fixtures.helpers import make_tarfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DATA = os.path.join(REPO_ROOT, "tests", "fixtures", "data")
+
+
+@pytest.mark.functional
+def test_uncompressed_size_read_from_archive_header(tmp_path):
+    """Tests that the uncompressed package size is read from gzip, zstd and lz4 headers without decompressing"""
+    package = tmp_path / "package.tar.gz"
+    make_tarfile(str(package), os.path.join(FIXTURE_DATA, "dbt_tester"))
+    extracted = tmp_path / "package.tar"
+    extracted.write_bytes(gzip.decompress(package.read_bytes()))
+    assert uncompressed_size(str(package)) == extracted.stat().st_size
+    assert uncompressed_size(str(extracted)) == extracted.stat().st_size
+
+    # A gzip package over 4GiB wraps ISIZE below its own compressed size
+    wrapped = tmp_path / "wrapped.tar.gz"
+    wrapped.write_bytes(package.read_bytes()[:-4] + struct.pack("<I", 16))
+    assert uncompressed_size(str(wrapped)) is None
+
+    # zstd single segment frame with a 4 byte content size, and one without a content size
+    zstd = tmp_path / "package.tar.zst"
+    zstd.write_bytes(b"\x28\xb5\x2f\xfd" + bytes([0xA0]) + struct.pack("<I", 123456) + b"\x00" * 16)
+    assert uncompressed_size(str(zstd)) == 123456
+    zstd.write_bytes(b"\x28\xb5\x2f\xfd" + bytes([0x00, 0x58]) + b"\x00" * 16)
+    assert uncompressed_size(str(zstd)) is None
+
+    # lz4 frame with the content size flag set, and one without it
+    lz4 = tmp_path / "package.tar.lz4"
+    lz4.write_bytes(b"\x04\x22\x4d\x18" + bytes([0x68, 0x40]) + struct.pack("<Q", 654321) + b"\x00" * 16)
+    assert uncompressed_size(str(lz4)) == 654321
+    lz4.write_bytes(b"\x04\x22\x4d\x18" + bytes([0x60, 0x40]) + b"\x00" * 16)
+    assert uncompressed_size(str(lz4)) is None
+
+
+@pytest.mark.functional
+def test_workspace_uses_memory_only_when_package_fits(tmp_path):
+    """Tests that auto mode picks the memory workspace for small packages and falls back to disk otherwise"""
+    memory_path = tmp_path / "shm"
+    memory_path.mkdir()
+    disk_root = str(tmp_path / "disk")
+
+    small = Workspace(root=disk_root, memory_path=str(memory_path), memory_budget_mb=1, run_id="run-1")
+    path = small.choose(100 * 1024)
+    assert small.used == "memory"
+    assert path == str(memory_path / "dbt_download_run-1") and os.path.isdir(path)
+    assert small.summary["estimated_bytes"] == 300 * 1024
+    small.cleanup()
+    assert not os.path.exists(path)
+
+    large = Workspace(root=disk_root, memory_path=str(memory_path), memory_budget_mb=1)
+    assert large.choose(1024 * 1024) == os.path.join(disk_root, "dbt_download")
+    assert large.used == "disk" and "exceeds" in large.reason
+    large.cleanup()
+    assert os.path.isdir(os.path.join(disk_root, "dbt_download"))
+
+    unknown = Workspace(root=disk_root, memory_path=str(memory_path), memory_budget_mb=1)
+    unknown.choose(None)
+    assert unknown.used == "disk" and unknown.reason == "package size is unknown"
+
+    disk = Workspace(root=disk_root, mode="disk", memory_path=str(memory_path), memory_budget_mb=1)
+    disk.choose(10)
+    assert disk.used == "disk"
+
+    forced = Workspace(root=disk_root, mode="memory", memory_path=str(tmp_path / "missing"), memory_budget_mb=1)
+    forced.choose(10)
+    assert forced.used == "disk" and "does not exist" in forced.reason
+
+    with pytest.raises(ValueError):
+        Workspace(mode="ramdisk")